@@ -1,2 +1,2 @@
-from core.env import Env
+from core.env import Env, VecEnv, SubprocVecEnv, AsyncEnvPool
 from core.agent import Agent
@@ -25,6 +25,8 @@ class ApeX(DQN):
         n_step: number of steps in multi-step Q learning.
     """
 
+    env_state_keys = ("tmp_buffer",)
+
     def __init__(
         self,
         # ApeX
@@ -57,7 +59,15 @@ class ApeX(DQN):
 
         # MultiStep
         self.n_step = n_step
-        self.memory = PERBuffer(self.buffer_size, uniform_sample_prob)
+        self.memory = self.prefetch(
+            PERBuffer(
+                self.buffer_size,
+                uniform_sample_prob,
+                self.stack_frame,
+                self.buffer_path,
+            ),
+            self.prefetch_batch,
+        )
         self.tmp_buffer = deque(maxlen=n_step + 1)
 
     @torch.no_grad()
@@ -108,8 +118,7 @@ class ApeX(DQN):
         # Update sum tree
         td_error = abs(target_q - q)
         p_j = torch.pow(td_error, self.alpha)
-        for i, p in zip(indices, p_j):
-            self.memory.update_priority(p.item(), i)
+        self.memory.update_priorities(indices, p_j.detach().cpu().numpy())
 
         weights = torch.unsqueeze(torch.FloatTensor(weights).to(self.device), -1)
 
@@ -1,9 +1,18 @@
 from abc import *
+import os
+import copy
 import torch
 import numpy as np
 
+from core.buffer import PrefetchBuffer
+
 
 class BaseAgent(ABC):
+    # whether act and interact_callback handle states of several envs at once. (VecEnv)
+    vectorizable = True
+    # attributes which keep interaction of one env. (kept for each env by switch_env)
+    env_state_keys = ()
+
     @abstractmethod
     def act(self, state):
         """
@@ -58,20 +67,31 @@ class BaseAgent(ABC):
         """
         pass
 
-    def as_tensor(self, x):
+    def as_tensor(self, x, pin_memory=False):
         if isinstance(x, list):
-            x = list(
-                map(
-                    lambda x: torch.as_tensor(
-                        x, dtype=torch.float32, device=self.device
-                    ),
-                    x,
-                )
-            )
+            x = list(map(lambda x: self.as_tensor(x, pin_memory), x))
+        elif pin_memory and self.device.type == "cuda":
+            # copy from page-locked memory to overlap with computation on device
+            x = torch.as_tensor(x, dtype=torch.float32).pin_memory()
+            x = x.to(self.device, non_blocking=True)
         else:
             x = torch.as_tensor(x, dtype=torch.float32, device=self.device)
         return x
 
+    def prefetch(self, memory, num_prefetch):
+        """
+        Wrap memory to prepare next batches (sample and conversion to tensor) in background thread.
+        Memory is returned as it is if num_prefetch is 0 or None.
+        """
+        if not num_prefetch:
+            return memory
+
+        def transform(transitions):
+            for key in transitions.keys():
+                transitions[key] = self.as_tensor(transitions[key], pin_memory=True)
+
+        return PrefetchBuffer(memory, num_prefetch, transform)
+
     def sync_in(self, weights):
         self.network.load_state_dict(weights)
 
@@ -84,12 +104,47 @@ class BaseAgent(ABC):
         }
         return sync_item
 
+    def save_buffer(self, path, compress=False):
+        self.memory.save(os.path.join(path, "buffer"), compress)
+
+    def load_buffer(self, path):
+        buffer_path = os.path.join(path, "buffer")
+        if os.path.exists(buffer_path):
+            self.memory.load(buffer_path)
+
     def set_distributed(self, *args, **kwargs):
         return self
 
     def interact_callback(self, transition):
         return transition
 
+    def switch_env(self, env_id):
+        """
+        Keep attributes of env_state_keys for the current env, and set those of env_id,
+        so that act and interact_callback continue the interaction of env_id.
+        Attributes of a new env are copied from those at the first switch.
+        """
+        if not self.env_state_keys:
+            return
+        if "env_states" not in self.__dict__:
+            self.env_states, self.env_id = dict(), None
+            self.env_state_init = {
+                key: copy.deepcopy(getattr(self, key)) for key in self.env_state_keys
+            }
+        if env_id == self.env_id:
+            return
+
+        if self.env_id is not None:
+            self.env_states[self.env_id] = {
+                key: getattr(self, key) for key in self.env_state_keys
+            }
+        env_state = self.env_states.pop(env_id, None)
+        if env_state is None:
+            env_state = copy.deepcopy(self.env_state_init)
+        for key, val in env_state.items():
+            setattr(self, key, val)
+        self.env_id = env_id
+
     def learning_rate_decay(self, step, optimizers=None, mode="cosine"):
         if mode == "linear":
             weight = 1 - (step / self.run_step)
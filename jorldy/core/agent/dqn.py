@@ -29,6 +29,13 @@ class DQN(BaseAgent):
         epsilon_eval (float): evaluate time epsilon value.
         explore_ratio (float): the ratio of steps the epsilon decays.
         buffer_size (int): the size of the memory buffer.
+        stack_frame (int): the number of stacked frames in one single state.
+            if it is set, each frame is stored only once in the memory buffer.
+        buffer_path (str): directory to keep the memory buffer in memory-mapped files.
+            if the memory buffer of a previous run is in it, the buffer is reopened.
+        buffer_snapshot (bool): parameter that determine whether to save and load the memory buffer with the model.
+        snapshot_compress (bool): parameter that determine whether to compress the saved memory buffer.
+        prefetch_batch (int): the number of batches prepared in background thread while learning. (0: no prefetch)
         batch_size (int): the number of samples in the one batch.
         start_train_step (int): steps to start learning.
         target_update_period (int): period to update the target network (unit: step)
@@ -53,6 +60,11 @@ class DQN(BaseAgent):
         epsilon_eval=0.0,
         explore_ratio=0.1,
         buffer_size=50000,
+        stack_frame=None,
+        buffer_path=None,
+        buffer_snapshot=False,
+        snapshot_compress=False,
+        prefetch_batch=0,
         batch_size=64,
         start_train_step=2000,
         target_update_period=500,
@@ -85,7 +97,14 @@ class DQN(BaseAgent):
         self.explore_step = run_step * explore_ratio
         self.epsilon_delta = (epsilon_init - epsilon_min) / self.explore_step
         self.buffer_size = buffer_size
-        self.memory = ReplayBuffer(buffer_size)
+        self.stack_frame = stack_frame
+        self.buffer_path = buffer_path
+        self.memory = self.prefetch(
+            ReplayBuffer(buffer_size, stack_frame, buffer_path), prefetch_batch
+        )
+        self.buffer_snapshot = buffer_snapshot
+        self.snapshot_compress = snapshot_compress
+        self.prefetch_batch = prefetch_batch
         self.batch_size = batch_size
         self.start_train_step = start_train_step
         self.target_update_stamp = 0
@@ -183,6 +202,7 @@ class DQN(BaseAgent):
 
     def save(self, path):
         print(f"...Save model to {path}...")
+        self.memory.flush()
         torch.save(
             {
                 "network": self.network.state_dict(),
@@ -190,6 +210,8 @@ class DQN(BaseAgent):
             },
             os.path.join(path, "ckpt"),
         )
+        if self.buffer_snapshot:
+            self.save_buffer(path, self.snapshot_compress)
 
     def load(self, path):
         print(f"...Load model from {path}...")
@@ -197,6 +219,8 @@ class DQN(BaseAgent):
         self.network.load_state_dict(checkpoint["network"])
         self.target_network.load_state_dict(checkpoint["network"])
         self.optimizer.load_state_dict(checkpoint["optimizer"])
+        if self.buffer_snapshot:
+            self.load_buffer(path)
 
     def set_distributed(self, id):
         self.epsilon = id / self.num_workers
@@ -24,6 +24,9 @@ class MPO(BaseAgent):
         critic (str): key of critic network class in _network_dict.txt.
         head (str): key of head in _head_dict.txt.
         buffer_size (int): the size of the memory buffer.
+        buffer_snapshot (bool): parameter that determine whether to save and load the memory buffer with the model.
+        snapshot_compress (bool): parameter that determine whether to compress the saved memory buffer.
+        prefetch_batch (int): the number of batches prepared in background thread while learning. (0: no prefetch)
         batch_size (int): the number of samples in the one batch.
         start_train_step (int): steps to start learning.
         n_epoch (int): Number of epoch when optimizing the surrogate.
@@ -47,6 +50,8 @@ class MPO(BaseAgent):
         alpha_sigma (float): Lagrange multipliers of variance part of Gaussian-KL constraint term.
     """
 
+    env_state_keys = ("tmp_buffer",)
+
     def __init__(
         self,
         state_size,
@@ -57,6 +62,9 @@ class MPO(BaseAgent):
         critic="discrete_q_network",
         head="mlp",
         buffer_size=50000,
+        buffer_snapshot=False,
+        snapshot_compress=False,
+        prefetch_batch=0,
         batch_size=64,
         start_train_step=2000,
         n_epoch=64,
@@ -150,7 +158,10 @@ class MPO(BaseAgent):
 
         self.gamma = gamma
         self.tmp_buffer = deque(maxlen=self.n_step)
-        self.memory = ReplayBuffer(buffer_size)
+        self.memory = self.prefetch(ReplayBuffer(buffer_size), prefetch_batch)
+        self.buffer_snapshot = buffer_snapshot
+        self.snapshot_compress = snapshot_compress
+        self.prefetch_batch = prefetch_batch
         self.run_step = run_step
         self.lr_decay = lr_decay
 
@@ -433,6 +444,8 @@ class MPO(BaseAgent):
             },
             os.path.join(path, "ckpt"),
         )
+        if self.buffer_snapshot:
+            self.save_buffer(path, self.snapshot_compress)
 
     def load(self, path):
         print(f"...Load model from {path}...")
@@ -443,6 +456,8 @@ class MPO(BaseAgent):
         self.target_critic.load_state_dict(self.critic.state_dict())
         self.actor_optimizer.load_state_dict(checkpoint["actor_optimizer"])
         self.critic_optimizer.load_state_dict(checkpoint["critic_optimizer"])
+        if self.buffer_snapshot:
+            self.load_buffer(path)
 
     def process(self, transitions, step):
         result = {}
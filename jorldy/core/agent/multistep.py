@@ -16,11 +16,16 @@ class Multistep(DQN):
         n_step (int): number of steps in multi-step Q learning.
     """
 
+    env_state_keys = ("tmp_buffer",)
+
     def __init__(self, n_step=5, **kwargs):
         super(Multistep, self).__init__(**kwargs)
         self.n_step = n_step
         self.tmp_buffer = deque(maxlen=n_step)
-        self.memory = ReplayBuffer(self.buffer_size)
+        self.memory = self.prefetch(
+            ReplayBuffer(self.buffer_size, self.stack_frame, self.buffer_path),
+            self.prefetch_batch,
+        )
 
     def learn(self):
         #         shapes of 1-step implementations: (batch_size, dimension_data)
@@ -7,7 +7,6 @@ torch.backends.cudnn.benchmark = True
 
 from core.network import Network
 from core.optimizer import Optimizer
-from collections import defaultdict
 from collections.abc import Iterable
 
 from core.buffer import MuzeroPERBuffer
@@ -24,6 +23,15 @@ class Muzero(BaseAgent):
         lr_decay: lr_decay option which apply decayed weight on parameters of network.
     """
 
+    # trajectory of act is kept for one env.
+    vectorizable = False
+    env_state_keys = (
+        "trajectory",
+        "trajectory_step_stamp",
+        "trajectory_start",
+        "max_step",
+    )
+
     def __init__(
         self,
         # MuZero
@@ -146,7 +154,14 @@ class Muzero(BaseAgent):
         self.buffer_size = buffer_size
         self.uniform_sample_prob = uniform_sample_prob
         self.beta_add = (1 - beta) / run_step
-        self.memory = MuzeroPERBuffer(self.buffer_size, uniform_sample_prob)
+        self.memory = MuzeroPERBuffer(
+            self.buffer_size,
+            uniform_sample_prob,
+            num_stack,
+            num_unroll,
+            num_td_step,
+            gamma,
+        )
 
         # MCTS
         self.num_mcts = num_mcts
@@ -198,45 +213,30 @@ class Muzero(BaseAgent):
             self.beta, self.batch_size
         )
 
-        _transitions = defaultdict(list)
+        # fill padded actions and policies of unroll windows
+        action_pad = transitions.pop("action_pad")
+        random_action = ((action_pad == 1) & self.use_prev_rand_action) | (
+            (action_pad == 2) & self.use_over_rand_action
+        )
+        transitions["action"][random_action] = np.random.randint(
+            self.action_size, size=random_action.sum()
+        )
         absorbing_policy = (
             np.full(self.action_size, 1 / self.action_size)
             if self.use_uniform_policy
             else np.zeros(self.action_size)
         )
+        transitions["policy"][transitions.pop("policy_pad")] = absorbing_policy
 
-        for trajectory, start in transitions:
-            # make target
-            end = start + self.num_unroll + 1
-            stack_len = self.num_stack + self.num_unroll
-            state, action = self.get_stacked_data(trajectory, end - 1, stack_len)
-
-            policy = trajectory["policies"][start:end]
-            policy += [absorbing_policy] * (self.num_unroll - len(policy) + 1)
-
-            reward = trajectory["rewards"][start : end - 1]
-            reward += [np.zeros((1, 1))] * (self.num_unroll - len(reward) + 1)
-
-            value = [self.get_bootstrap_value(trajectory, i) for i in range(start, end)]
-
-            _transitions["state"].append(state)
-            _transitions["action"].append(action)
-            _transitions["reward"].append(reward)
-            _transitions["policy"].append(policy)
-            _transitions["value"].append(value)
-
-        for key in _transitions.keys():
-            value = np.stack(_transitions[key], axis=0)
-            if key in ("reward", "value"):
-                value = value.squeeze(axis=-1)
-            _transitions[key] = self.as_tensor(value)
+        for key in transitions.keys():
+            transitions[key] = self.as_tensor(transitions[key])
 
-        state = _transitions["state"]
-        action = _transitions["action"]
+        state = transitions["state"]
+        action = transitions["action"]
         selected_action = action[:, -self.num_unroll :]
-        target_policy = _transitions["policy"]
-        target_reward_s = _transitions["reward"]
-        target_value_s = _transitions["value"]
+        target_policy = transitions["policy"]
+        target_reward_s = transitions["reward"]
+        target_value_s = transitions["value"]
 
         target_reward = self.network.converter.scalar2vector(target_reward_s)
         target_value = self.network.converter.scalar2vector(target_value_s)
@@ -259,8 +259,7 @@ class Muzero(BaseAgent):
         # Update sum tree
         td_error = abs(value_s - target_value_s[:, 0])
         p_j = torch.pow(td_error, self.alpha)
-        for i, p in zip(indices, p_j):
-            self.memory.update_priority(p.item(), i)
+        self.memory.update_priorities(indices, p_j.detach().cpu().numpy())
 
         policy_loss = -(target_policy[:, 0] * pi).sum(1)
         value_loss = -(target_value[:, 0] * value).sum(1)
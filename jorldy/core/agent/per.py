@@ -27,7 +27,15 @@ class PER(DQN):
         **kwargs
     ):
         super(PER, self).__init__(run_step=run_step, **kwargs)
-        self.memory = PERBuffer(self.buffer_size, uniform_sample_prob)
+        self.memory = self.prefetch(
+            PERBuffer(
+                self.buffer_size,
+                uniform_sample_prob,
+                self.stack_frame,
+                self.buffer_path,
+            ),
+            self.prefetch_batch,
+        )
         self.alpha = alpha
         self.beta = beta
         self.beta_add = (1 - beta) / run_step
@@ -66,8 +74,7 @@ class PER(DQN):
         # Update sum tree
         td_error = abs(target_q - q)
         p_j = torch.pow(td_error, self.alpha)
-        for i, p in zip(indices, p_j):
-            self.memory.update_priority(p.item(), i)
+        self.memory.update_priorities(indices, p_j.detach().cpu().numpy())
 
         weights = torch.unsqueeze(torch.FloatTensor(weights).to(self.device), -1)
 
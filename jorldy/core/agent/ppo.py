@@ -5,6 +5,7 @@ import torch.nn.functional as F
 from torch.distributions import Normal, Categorical
 import numpy as np
 
+from core.buffer import RolloutBuffer
 from .reinforce import REINFORCE
 
 
@@ -23,6 +24,9 @@ class PPO(REINFORCE):
         num_workers: the number of agents in distributed learning.
     """
 
+    # rollout of each env is kept in its own row of RolloutBuffer.
+    vectorizable = True
+
     def __init__(
         self,
         network="discrete_policy_value",
@@ -50,6 +54,7 @@ class PPO(REINFORCE):
         self.num_workers = num_workers
         self.time_t = 0
         self.learn_stamp = 0
+        self.memory = RolloutBuffer(n_step, num_workers)
 
     @torch.no_grad()
     def act(self, state, training=True):
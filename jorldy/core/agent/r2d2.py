@@ -19,6 +19,16 @@ class R2D2(ApeX):
         eta (float): priority exponent.
     """
 
+    # hidden state and sequence of act are kept for one env.
+    vectorizable = False
+    env_state_keys = (
+        "tmp_buffer",
+        "hidden",
+        "prev_action",
+        "store_period_stamp",
+        "store_start",
+    )
+
     def __init__(
         self,
         # R2D2
@@ -146,8 +156,7 @@ class R2D2(ApeX):
             1 - self.eta
         ) * torch.mean(td_error, axis=1)
         p_j = torch.pow(priority, self.alpha)
-        for i, p in zip(indices, p_j):
-            self.memory.update_priority(p.item(), i)
+        self.memory.update_priorities(indices, p_j.detach().cpu().numpy())
 
         # Annealing beta
         self.beta = min(1.0, self.beta + self.beta_add)
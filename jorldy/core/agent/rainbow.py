@@ -24,6 +24,13 @@ class Rainbow(DQN):
             (key: 'name', value: name of optimizer)
         gamma (float): discount factor.
         buffer_size (int): the size of the memory buffer.
+        stack_frame (int): the number of stacked frames in one single state.
+            if it is set, each frame is stored only once in the memory buffer.
+        buffer_path (str): directory to keep the memory buffer in memory-mapped files.
+            if the memory buffer of a previous run is in it, the buffer is reopened.
+        buffer_snapshot (bool): parameter that determine whether to save and load the memory buffer with the model.
+        snapshot_compress (bool): parameter that determine whether to compress the saved memory buffer.
+        prefetch_batch (int): the number of batches prepared in background thread while learning. (0: no prefetch)
         batch_size (int): the number of samples in the one batch.
         start_train_step (int): steps to start learning.
         target_update_period (int): period to update the target network. (unit: step)
@@ -43,6 +50,8 @@ class Rainbow(DQN):
             (e.g. 'cpu' or 'gpu'. None can also be used, and in this case, the cpu is used.)
     """
 
+    env_state_keys = ("tmp_buffer",)
+
     def __init__(
         self,
         state_size,
@@ -53,6 +62,11 @@ class Rainbow(DQN):
         optim_config={"name": "adam"},
         gamma=0.99,
         buffer_size=50000,
+        stack_frame=None,
+        buffer_path=None,
+        buffer_snapshot=False,
+        snapshot_compress=False,
+        prefetch_batch=0,
         batch_size=64,
         start_train_step=2000,
         target_update_period=500,
@@ -128,7 +142,13 @@ class Rainbow(DQN):
         self.num_support = num_support
 
         # MultiStep
-        self.memory = PERBuffer(buffer_size, uniform_sample_prob)
+        self.memory = self.prefetch(
+            PERBuffer(buffer_size, uniform_sample_prob, stack_frame, buffer_path),
+            prefetch_batch,
+        )
+        self.buffer_snapshot = buffer_snapshot
+        self.snapshot_compress = snapshot_compress
+        self.prefetch_batch = prefetch_batch
 
         # C51
         self.delta_z = (v_max - v_min) / (num_support - 1)
@@ -227,8 +247,7 @@ class Rainbow(DQN):
         KL = -(target_dist * torch.clamp(p_action, min=1e-8).log()).sum(-1)
         p_j = torch.pow(KL, self.alpha)
 
-        for i, p in zip(indices, p_j):
-            self.memory.update_priority(p.item(), i)
+        self.memory.update_priorities(indices, p_j.detach().cpu().numpy())
 
         weights = torch.unsqueeze(torch.FloatTensor(weights).to(self.device), -1)
 
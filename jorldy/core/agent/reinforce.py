@@ -29,6 +29,9 @@ class REINFORCE(BaseAgent):
             (e.g. 'cpu' or 'gpu'. None can also be used, and in this case, the cpu is used.)
     """
 
+    # learns at the end of each episode of one env.
+    vectorizable = False
+
     def __init__(
         self,
         state_size,
@@ -62,6 +65,7 @@ class REINFORCE(BaseAgent):
         self.memory = RolloutBuffer()
         self.run_step = run_step
         self.lr_decay = lr_decay
+        self.worker_id = 0
 
     @torch.no_grad()
     def act(self, state, training=True):
@@ -125,6 +129,17 @@ class REINFORCE(BaseAgent):
 
         return result
 
+    def set_distributed(self, id):
+        self.worker_id = id
+        return self
+
+    def interact_callback(self, transition):
+        # rollout buffer keeps consecutive transitions of each worker (and env) together.
+        num_envs = len(transition["reward"])
+        worker = self.worker_id * num_envs + np.arange(num_envs)
+        transition["worker"] = worker[:, np.newaxis]
+        return transition
+
     def save(self, path):
         print(f"...Save model to {path}...")
         torch.save(
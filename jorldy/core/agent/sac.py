@@ -26,6 +26,9 @@ class SAC(BaseAgent):
         gamma (float): discount factor.
         tau (float): the soft update coefficient (for soft target update).
         buffer_size (int): the size of the memory buffer.
+        buffer_snapshot (bool): parameter that determine whether to save and load the memory buffer with the model.
+        snapshot_compress (bool): parameter that determine whether to compress the saved memory buffer.
+        prefetch_batch (int): the number of batches prepared in background thread while learning. (0: no prefetch)
         batch_size (int): the number of samples in the one batch.
         start_train_step (int): steps to start learning.
         static_log_alpha (float): static value used as log alpha when use_dynamic_alpha is false.
@@ -56,6 +59,9 @@ class SAC(BaseAgent):
         gamma=0.99,
         tau=5e-3,
         buffer_size=50000,
+        buffer_snapshot=False,
+        snapshot_compress=False,
+        prefetch_batch=0,
         batch_size=64,
         start_train_step=2000,
         static_log_alpha=-2.0,
@@ -112,7 +118,10 @@ class SAC(BaseAgent):
 
         self.gamma = gamma
         self.tau = tau
-        self.memory = ReplayBuffer(buffer_size)
+        self.memory = self.prefetch(ReplayBuffer(buffer_size), prefetch_batch)
+        self.buffer_snapshot = buffer_snapshot
+        self.snapshot_compress = snapshot_compress
+        self.prefetch_batch = prefetch_batch
         self.batch_size = batch_size
         self.start_train_step = start_train_step
         self.run_step = run_step
@@ -324,6 +333,8 @@ class SAC(BaseAgent):
             save_dict["alpha_optimizer"] = self.alpha_optimizer.state_dict()
 
         torch.save(save_dict, os.path.join(path, "ckpt"))
+        if self.buffer_snapshot:
+            self.save_buffer(path, self.snapshot_compress)
 
     def load(self, path):
         print(f"...Load model from {path}...")
@@ -341,6 +352,8 @@ class SAC(BaseAgent):
         if self.use_dynamic_alpha and "log_alpha" in checkpoint.keys():
             self.log_alpha = checkpoint["log_alpha"]
             self.alpha_optimizer.load_state_dict(checkpoint["alpha_optimizer"])
+        if self.buffer_snapshot:
+            self.load_buffer(path)
 
     def sync_in(self, weights):
         self.actor.load_state_dict(weights)
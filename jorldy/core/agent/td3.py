@@ -25,6 +25,9 @@ class TD3(BaseAgent):
         optim_config (dict): dictionary of the optimizer info.
         gamma (float): discount factor.
         buffer_size (int): the size of the memory buffer.
+        buffer_snapshot (bool): parameter that determine whether to save and load the memory buffer with the model.
+        snapshot_compress (bool): parameter that determine whether to compress the saved memory buffer.
+        prefetch_batch (int): the number of batches prepared in background thread while learning. (0: no prefetch)
         batch_size (int): the number of samples in the one batch.
         start_train_step (int): steps to start learning.
         initial_random_step : number of  uniform-random action step, before running real policy.
@@ -55,6 +58,9 @@ class TD3(BaseAgent):
         },
         gamma=0.99,
         buffer_size=50000,
+        buffer_snapshot=False,
+        snapshot_compress=False,
+        prefetch_batch=0,
         batch_size=128,
         start_train_step=1000,
         initial_random_step=0,
@@ -113,7 +119,10 @@ class TD3(BaseAgent):
 
         self.gamma = gamma
         self.tau = tau
-        self.memory = ReplayBuffer(buffer_size)
+        self.memory = self.prefetch(ReplayBuffer(buffer_size), prefetch_batch)
+        self.buffer_snapshot = buffer_snapshot
+        self.snapshot_compress = snapshot_compress
+        self.prefetch_batch = prefetch_batch
         self.batch_size = batch_size
         self.start_train_step = start_train_step
         self.initial_random_step = initial_random_step
@@ -238,6 +247,8 @@ class TD3(BaseAgent):
             "critic_optimizer2": self.critic_optimizer2.state_dict(),
         }
         torch.save(save_dict, os.path.join(path, "ckpt"))
+        if self.buffer_snapshot:
+            self.save_buffer(path, self.snapshot_compress)
 
     def load(self, path):
         print(f"...Load model from {path}...")
@@ -251,6 +262,8 @@ class TD3(BaseAgent):
         self.target_critic2.load_state_dict(self.critic2.state_dict())
         self.critic_optimizer1.load_state_dict(checkpoint["critic_optimizer1"])
         self.critic_optimizer2.load_state_dict(checkpoint["critic_optimizer2"])
+        if self.buffer_snapshot:
+            self.load_buffer(path)
 
     def sync_in(self, weights):
         self.actor.load_state_dict(weights)
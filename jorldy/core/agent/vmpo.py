@@ -5,6 +5,7 @@ import numpy as np
 
 from .reinforce import REINFORCE
 from core.optimizer import Optimizer
+from core.buffer import RolloutBuffer
 
 
 class VMPO(REINFORCE):
@@ -27,8 +28,12 @@ class VMPO(REINFORCE):
         eta (float): Lagrange multipliers of temperature loss term.
         alpha_mu (float): Lagrange multipliers of mean part of Gaussian-KL constraint term (trust-region loss).
         alpha_sigma (float): Lagrange multipliers of variance part of Gaussian-KL constraint term.
+        num_workers: the number of agents in distributed learning.
     """
 
+    # rollout of each env is kept in its own row of RolloutBuffer.
+    vectorizable = True
+
     def __init__(
         self,
         network="discrete_policy_value",
@@ -48,6 +53,7 @@ class VMPO(REINFORCE):
         eta=1.0,
         alpha_mu=1.0,
         alpha_sigma=1.0,
+        num_workers=1,
         **kwargs,
     ):
         super(VMPO, self).__init__(
@@ -62,6 +68,8 @@ class VMPO(REINFORCE):
         self._lambda = _lambda
         self.time_t = 0
         self.learn_stamp = 0
+        self.num_workers = num_workers
+        self.memory = RolloutBuffer(n_step, num_workers)
         self.clip_grad_norm = clip_grad_norm
 
         self.min_eta = torch.tensor(min_eta, device=self.device)
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class FrameStorage:
+    """Frame storage which keeps each frame of stacked-frame states only once.
+
+    Stacked states are split into frames, and the frames are stored in a shared pool.
+    Consecutive states (and state/next_state in the same transition) share most of
+    their frames, so they are deduplicated by comparing them with recently stored
+    frames. States are stored as indices of their frames in the pool.
+
+    Args:
+        capacity (int): initial number of frames in the pool. the pool grows if it is full.
+        stack_frame (int): the number of stacked frames in one single state.
+        allocate (function): function to allocate the pool. (name, shape, dtype, length)
+        resize (function): function to resize the pool. (name, pool, length)
+        cache_size (int): the number of recent frames to compare with a new frame.
+    """
+
+    def __init__(
+        self, capacity, stack_frame, allocate=None, resize=None, cache_size=None
+    ):
+        self.capacity = capacity
+        self.stack_frame = stack_frame
+        self.allocate = allocate if allocate else self.allocate_array
+        self.resize = resize if resize else self.resize_array
+        self.cache_size = cache_size if cache_size else 256 * stack_frame
+
+        self.frames = None  # allocated at first store
+        self.ref_count = np.zeros(capacity, dtype=np.int64)
+        self.frame_hash = np.zeros(capacity, dtype=np.int64)
+        self.free_slots = list(reversed(range(capacity)))
+        self.cache = OrderedDict()  # frame hash -> slot in pool
+        self.held_slots = None  # freed slots which can not be reused yet
+
+    def store(self, stacks):
+        """
+        Store stacked states into pool and return indices of their frames.
+
+        Parameter Type / Shape
+        - stacks:   ndarray / (N_batch, stack_frame * C, *D_frame) ex) (32, 4, 84, 84)
+        - indices:  ndarray / (N_batch, stack_frame)
+        """
+        frames = stacks.reshape(len(stacks), self.stack_frame, -1, *stacks.shape[2:])
+        if self.frames is None:
+            self.frames = self.allocate(
+                "frames", frames.shape[2:], frames.dtype, self.capacity
+            )
+
+        indices = np.empty(frames.shape[:2], dtype=np.int64)
+        for i in range(len(frames)):
+            for j in range(self.stack_frame):
+                indices[i, j] = self.add_frame(frames[i, j])
+
+        np.add.at(self.ref_count, indices.ravel(), 1)
+        return indices
+
+    def add_frame(self, frame):
+        key = hash(frame.tobytes())
+        slot = self.cache.get(key)
+        if slot is not None and np.array_equal(self.frames[slot], frame):
+            self.cache.move_to_end(key)
+            return slot
+
+        if not self.free_slots:
+            self.grow()
+        slot = self.free_slots.pop()
+        self.frames[slot] = frame
+        self.frame_hash[slot] = key
+        self.cache[key] = slot
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return slot
+
+    def release(self, indices):
+        """
+        Release frames of the states which are removed from buffer.
+
+        Parameter Type / Shape
+        - indices:  ndarray / (N_batch, stack_frame), negative index means empty state.
+        """
+        indices = indices[indices >= 0]
+        np.add.at(self.ref_count, indices, -1)
+
+        freed = np.unique(indices[self.ref_count[indices] == 0])
+        for slot in freed:
+            key = self.frame_hash[slot]
+            if self.cache.get(key) == slot:
+                del self.cache[key]
+        if self.held_slots is None:
+            self.free_slots += freed.tolist()
+        else:
+            self.held_slots += freed.tolist()
+
+    def hold(self):
+        """
+        Hold freed slots until unhold, so that frames are not overwritten. (e.g. while saving)
+        """
+        if self.held_slots is None:
+            self.held_slots = []
+
+    def unhold(self):
+        if self.held_slots is not None:
+            self.free_slots += self.held_slots
+            self.held_slots = None
+
+    def read(self, indices):
+        """
+        Rebuild stacked states from indices of their frames.
+
+        Parameter Type / Shape
+        - indices:  ndarray / (N_batch, stack_frame)
+        - stacks:   ndarray / (N_batch, stack_frame * C, *D_frame) ex) (32, 4, 84, 84)
+        """
+        frames = self.frames[indices]
+        return frames.reshape(len(frames), -1, *frames.shape[3:])
+
+    def grow(self):
+        extra = max(self.stack_frame, self.capacity // 8)
+        self.frames = self.resize("frames", self.frames, self.capacity + extra)
+        self.ref_count = np.concatenate((self.ref_count, np.zeros(extra, np.int64)))
+        self.frame_hash = np.concatenate((self.frame_hash, np.zeros(extra, np.int64)))
+        self.free_slots += list(reversed(range(self.capacity, self.capacity + extra)))
+        self.capacity += extra
+
+    def allocate_array(self, name, shape, dtype, length):
+        return np.zeros((length, *shape), dtype=dtype)
+
+    def resize_array(self, name, array, length):
+        extra = np.zeros((length - len(array), *array.shape[1:]), array.dtype)
+        return np.concatenate((array, extra))
+
+    def state_dict(self):
+        return {
+            "capacity": self.capacity,
+            "ref_count": self.ref_count,
+            "frame_hash": self.frame_hash,
+            "free_slots": self.free_slots
+            + (self.held_slots if self.held_slots is not None else []),
+        }
+
+    def load_state_dict(self, state):
+        self.capacity = state["capacity"]
+        self.ref_count = state["ref_count"]
+        self.frame_hash = state["frame_hash"]
+        self.free_slots = state["free_slots"]
+        self.cache.clear()
+
+    @property
+    def size(self):
+        return self.capacity - len(self.free_slots)
@@ -5,7 +5,32 @@ from .base import BaseBuffer
 
 # Reference: https://github.com/LeejwUniverse/following_deepmid/tree/master/jungwoolee_pytorch/100%20Algorithm_For_RL/01%20sum_tree
 class MuzeroPERBuffer(BaseBuffer):
-    def __init__(self, buffer_size, uniform_sample_prob=1e-3):
+    """Prioritized trajectory buffer for MuZero.
+
+    Steps of trajectories are stored in contiguous ring arrays, and each trajectory
+    occupies consecutive rows from its first row. Each sampled position is a leaf of
+    sum tree, and stacked unroll windows of the positions are gathered at once.
+
+    Args:
+        buffer_size (int): the number of positions which can be sampled.
+        uniform_sample_prob (float): ratio of uniform sampling.
+        num_stack (int): the number of stacked states and actions before the position.
+        num_unroll (int): the number of unroll steps after the position.
+        num_td_step (int): the number of steps to bootstrap value target.
+        gamma (float): discount factor.
+    """
+
+    traj_keys = ("states", "actions", "rewards", "values", "policies")
+
+    def __init__(
+        self,
+        buffer_size,
+        uniform_sample_prob=1e-3,
+        num_stack=32,
+        num_unroll=5,
+        num_td_step=10,
+        gamma=0.997,
+    ):
         super(MuzeroPERBuffer, self).__init__()
         self.buffer_size = buffer_size
         self.buffer_counter = 0
@@ -15,12 +40,27 @@ class MuzeroPERBuffer(BaseBuffer):
         self.tree_start = self.first_leaf_index
         self.tree_end = self.first_leaf_index
         self.sum_tree = np.zeros(self.tree_size)  # define sum tree
-        self.look_up = np.zeros((buffer_size, 2), dtype=int)
-
-        self.trajectories = []
+        self.leaf_traj = np.zeros(buffer_size, dtype=np.int64)  # id of trajectory
+        self.leaf_pos = np.zeros(buffer_size, dtype=np.int64)  # position in trajectory
+
+        # steps of trajectories (allocated at first store)
+        self.step_size = 2 * buffer_size
+        self.steps = dict()
+        self.row_end = 0
+
+        # trajectories in buffer have ids from traj_offset to traj_index - 1
+        self.traj_row = np.zeros(buffer_size, dtype=np.int64)
+        self.traj_rows = np.zeros(buffer_size, dtype=np.int64)
+        self.traj_len = np.zeros((buffer_size, len(self.traj_keys)), dtype=np.int64)
+        self.traj_num_leaf = np.zeros(buffer_size, dtype=np.int64)
         self.traj_index = 0
         self.traj_offset = 0
 
+        self.num_stack = num_stack
+        self.num_unroll = num_unroll
+        self.num_td_step = num_td_step
+        self.gamma = gamma
+
         self.max_priority = 1.0
         self.uniform_sample_prob = uniform_sample_prob
 
@@ -33,84 +73,137 @@ class MuzeroPERBuffer(BaseBuffer):
 
             n = len(transition["priorities"])
             assert n < self.buffer_size
+            if n == 0:
+                continue
+
+            trajectory = transition["trajectory"]
+            if not self.steps:
+                self.allocate(trajectory)
+            lengths = [len(trajectory[key]) for key in self.traj_keys]
+            num_rows = max(lengths)
+            assert num_rows <= self.step_size
+
+            # trajectory is not split at the end of ring arrays
+            row = self.row_end if self.row_end + num_rows <= self.step_size else 0
+            self.remove_to_fit(n, row, num_rows)
+
+            for key, length in zip(self.traj_keys, lengths):
+                values = np.asarray(trajectory[key], dtype=self.steps[key].dtype)
+                self.steps[key][row : row + length] = values.reshape(
+                    length, *self.steps[key].shape[1:]
+                )
+
+            slot = self.traj_index % self.buffer_size
+            self.traj_row[slot] = row
+            self.traj_rows[slot] = num_rows
+            self.traj_len[slot] = lengths
+            self.traj_num_leaf[slot] = n
+            self.add_tree_data(transition["priorities"], transition["start"])
 
-            for pos, new_priority in enumerate(
-                transition["priorities"], start=transition["start"]
-            ):
-                self.add_tree_data(new_priority, pos)
-
-            self.trajectories.append((transition["trajectory"], n, transition["start"]))
             self.traj_index += 1
-            self.buffer_counter = min(self.buffer_counter + n, self.buffer_size)
-
-        self.remove_to_fit()
-
-    def add_tree_data(self, new_priority, pos):
-        self.update_priority(new_priority, self.tree_end)
-        self.look_up[self.tree_end - self.first_leaf_index] = (self.traj_index, pos)
-
-        self.tree_end += 1
+            self.row_end = row + num_rows
+
+    def allocate(self, trajectory):
+        state = np.asarray(trajectory["states"][0])
+        policy = np.asarray(trajectory["policies"][0])
+        shapes = {
+            "states": (state.shape[1:], state.dtype),
+            "actions": ((), np.int64),
+            "rewards": ((), np.float64),
+            "values": ((), np.float64),
+            "policies": (policy.shape, np.float64),
+        }
+        for key, (shape, dtype) in shapes.items():
+            self.steps[key] = np.zeros((self.step_size, *shape), dtype=dtype)
+
+    def add_tree_data(self, new_priorities, start):
+        num_priorities = len(new_priorities)
+        offsets = (self.tree_end - self.first_leaf_index) + np.arange(num_priorities)
+        leaves = offsets % self.buffer_size
+        self.update_priorities(leaves + self.first_leaf_index, new_priorities)
+        self.leaf_traj[leaves] = self.traj_index
+        self.leaf_pos[leaves] = start + np.arange(num_priorities)
+
+        self.tree_end = int(leaves[-1]) + 1 + self.first_leaf_index
         if self.tree_end == self.tree_size:
             self.tree_end = self.first_leaf_index
+        self.buffer_counter += num_priorities
 
     def update_priority(self, new_priority, index):
-        ex_priority = self.sum_tree[index]
-        delta_priority = new_priority - ex_priority
-        self.sum_tree[index] = new_priority
-        self.update_tree(index, delta_priority)
-
-        self.max_priority = max(self.max_priority, new_priority)
-
-    def update_tree(self, index, delta_priority):
-        # index is a starting leaf node point.
-        while index > 0:
-            index = (index - 1) // 2  # parent node index.
-            self.sum_tree[index] += delta_priority
-
-    def remove_to_fit(self):
-        if self.buffer_counter < self.buffer_size:
-            return
-
-        self.tree_start = self.tree_end
-        new_offset, pos = self.look_up[self.tree_end - self.first_leaf_index]
-        _, n_traj, start = self.trajectories[new_offset - self.traj_offset]
-        if pos > start:
-            new_start = self.tree_end + n_traj - pos + start
-            if new_start >= self.tree_size:
-                self.remove_priorites(self.tree_start, self.tree_size)
-                self.tree_start = self.first_leaf_index
-                new_start -= self.buffer_size
-
-            self.remove_priorites(self.tree_start, new_start)
-            self.tree_start = new_start
-            new_offset += 1
-
-        del self.trajectories[: new_offset - self.traj_offset]
-        self.traj_offset = new_offset
-
-    def remove_priorites(self, start, end):
-        for i in range(start, end):
-            self.update_priority(0, i)
-
-        self.buffer_counter -= max(0, end - start)
-
-    def search_tree(self, num):
-        index = 0  # always start from root index.
-        while index < self.first_leaf_index:
-            left = (index * 2) + 1
-            right = (index * 2) + 2
-
-            if num <= self.sum_tree[left]:  # if child left node is over current value.
-                index = left  # go to the left direction.
-            else:
-                num -= self.sum_tree[left]  # if child left node is under current value.
-                index = right  # go to the right direction.
-
-        return index
+        self.update_priorities([index], [new_priority])
+
+    def update_priorities(self, indices, new_priorities):
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        new_priorities = np.asarray(new_priorities, dtype=np.float64).ravel()
+        assert len(indices) == len(new_priorities)
+
+        # if an index is duplicated, the last priority is applied.
+        self.sum_tree[indices] = new_priorities
+        self.update_tree(indices)
+
+        self.max_priority = max(self.max_priority, np.max(new_priorities))
+
+    def update_tree(self, indices):
+        # indices are starting leaf node points.
+        indices = np.unique(indices[indices > 0])
+        while len(indices) > 0:
+            indices = np.unique((indices - 1) // 2)  # parent node indices.
+            self.sum_tree[indices] = (
+                self.sum_tree[(indices * 2) + 1] + self.sum_tree[(indices * 2) + 2]
+            )
+            indices = indices[indices > 0]
+
+    def remove_to_fit(self, num_priorities, row, num_rows):
+        # the oldest trajectories are removed until the new trajectory fits.
+        while self.traj_offset < self.traj_index:
+            slot = self.traj_offset % self.buffer_size
+            first, last = (
+                self.traj_row[slot],
+                self.traj_row[slot] + self.traj_rows[slot],
+            )
+            overlap = (first < row + num_rows and last > row) or (
+                row < self.row_end <= first  # skipped rows at the end of ring arrays
+            )
+            if not overlap and self.buffer_counter + num_priorities <= self.buffer_size:
+                break
+            self.remove_trajectory(slot)
+
+    def remove_trajectory(self, slot):
+        n = self.traj_num_leaf[slot]
+        offsets = (self.tree_start - self.first_leaf_index) + np.arange(n)
+        leaves = offsets % self.buffer_size + self.first_leaf_index
+        self.update_priorities(leaves, np.zeros(n))
+
+        self.tree_start = int(leaves[-1]) + 1
+        if self.tree_start == self.tree_size:
+            self.tree_start = self.first_leaf_index
+        self.buffer_counter -= n
+        self.traj_offset += 1
+
+    def search_tree(self, nums):
+        nums = np.array(nums, dtype=np.float64)
+        indices = np.zeros(len(nums), dtype=np.int64)  # always start from root index.
+        # all targets go down together, leaf nodes can lie on two different levels.
+        while True:
+            is_parent = indices < self.first_leaf_index
+            if not is_parent.any():
+                break
+
+            left = (indices[is_parent] * 2) + 1
+            right = (indices[is_parent] * 2) + 2
+            left_sum = self.sum_tree[left]
+            num = nums[is_parent]
+
+            # if child left node is over current value, go to the left direction.
+            # if child left node is under current value, go to the right direction.
+            go_left = num <= left_sum
+            indices[is_parent] = np.where(go_left, left, right)
+            nums[is_parent] = np.where(go_left, num, num - left_sum)
+
+        return indices
 
     def sample(self, beta, batch_size):
         assert self.sum_tree[0] > 0.0
-        # TODO: reduce sampling calculation
         uniform_sampling = np.random.uniform(size=batch_size) < self.uniform_sample_prob
         uniform_size = np.sum(uniform_sampling)
         prioritized_size = batch_size - uniform_size
@@ -118,15 +211,15 @@ class MuzeroPERBuffer(BaseBuffer):
         targets = np.random.randint(
             self.tree_start, self.tree_start + self.buffer_counter, size=uniform_size
         )
-        uniform_indices = list(
-            np.where(targets < self.tree_size, targets, targets - self.buffer_size)
+        uniform_indices = np.where(
+            targets < self.tree_size, targets, targets - self.buffer_size
         )
 
         targets = np.random.uniform(size=prioritized_size) * self.sum_tree[0]
-        prioritized_indices = [self.search_tree(target) for target in targets]
+        prioritized_indices = self.search_tree(targets)
 
-        indices = np.asarray(uniform_indices + prioritized_indices)
-        priorities = np.asarray([self.sum_tree[index] for index in indices])
+        indices = np.concatenate((uniform_indices, prioritized_indices))
+        priorities = self.sum_tree[indices]
         assert len(indices) == len(priorities) == batch_size
 
         uniform_probs = np.asarray(1.0 / self.buffer_counter)
@@ -137,15 +230,76 @@ class MuzeroPERBuffer(BaseBuffer):
         weights = (uniform_probs / sample_probs) ** beta
         weights /= np.max(weights)
 
-        transitions = [
-            (self.trajectories[traj_idx - self.traj_offset][0], start)
-            for traj_idx, start in self.look_up[indices - self.first_leaf_index]
-        ]
+        transitions = self.read(indices - self.first_leaf_index)
 
         sampled_p = np.mean(priorities)
         mean_p = self.sum_tree[0] / self.buffer_counter
         return transitions, weights, indices, sampled_p, mean_p
 
+    def read(self, leaves):
+        """
+        Gather stacked unroll windows of the sampled positions.
+
+        Parameter Type / Shape
+        - leaves:       ndarray / (N_batch,)
+        - state:        ndarray / (N_batch, (num_stack + num_unroll + 1) * C, *D_state[1:])
+        - action:       ndarray / (N_batch, num_stack + num_unroll)
+        - action_pad:   ndarray / (N_batch, num_stack + num_unroll),
+                            0: action of trajectory, 1: before start, 2: after end
+        - reward:       ndarray / (N_batch, num_unroll + 1, 1)
+        - value:        ndarray / (N_batch, num_unroll + 1, 1)
+        - policy:       ndarray / (N_batch, num_unroll + 1, D_action)
+        - policy_pad:   ndarray / (N_batch, num_unroll + 1), True: after end
+        """
+        slots = self.leaf_traj[leaves] % self.buffer_size
+        row = self.traj_row[slots]
+        max_pos = self.traj_rows[slots] - 1
+        len_s, len_a, len_r, len_v, len_p = [
+            length[:, None] for length in self.traj_len[slots].T
+        ]
+        pos = self.leaf_pos[leaves][:, None]
+
+        def gather(key, i, mask):
+            shape = (-1,) + (1,) * (i.ndim - 1)
+            i = np.clip(i, 0, max_pos.reshape(shape))
+            values = self.steps[key][row.reshape(shape) + i]
+            mask = mask.reshape(*mask.shape, *([1] * (values.ndim - mask.ndim)))
+            return np.where(mask, values, 0)
+
+        # stacked states and actions until the end of unroll
+        i = pos + np.arange(-self.num_stack, self.num_unroll + 1)
+        state = gather("states", i, (i >= 0) & (i < len_s)).astype(np.float32)
+        state = state.reshape(len(leaves), -1, *state.shape[3:])
+
+        i = i[:, :-1]
+        action = gather("actions", i, (i >= 0) & (i < len_a))
+        action_pad = np.where(i < 0, 1, np.where(i >= len_a, 2, 0))
+
+        # targets of unroll steps
+        i = pos + np.arange(self.num_unroll + 1)
+        reward = gather("rewards", i, (i < pos + self.num_unroll) & (i < len_r))
+        policy = gather("policies", i, i < len_p)
+        policy_pad = i >= len_p
+
+        # n-step bootstrap value
+        td = np.arange(self.num_td_step)
+        j = i[..., None] + td
+        rewards = gather("rewards", j, j < len_r[..., None])
+        j = i + self.num_td_step
+        value = (rewards * self.gamma**td).sum(-1) + (
+            self.gamma**self.num_td_step
+        ) * gather("values", j, j < len_v)
+
+        return {
+            "state": state,
+            "action": action,
+            "action_pad": action_pad,
+            "reward": reward[..., None],
+            "value": value[..., None],
+            "policy": policy,
+            "policy_pad": policy_pad,
+        }
+
     def check_dim(self, transition):
         print("########################################")
         print("You should check dimension of transition")
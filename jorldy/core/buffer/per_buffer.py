@@ -5,67 +5,96 @@ from .replay_buffer import ReplayBuffer
 
 # Reference: https://github.com/LeejwUniverse/following_deepmid/tree/master/jungwoolee_pytorch/100%20Algorithm_For_RL/01%20sum_tree
 class PERBuffer(ReplayBuffer):
-    def __init__(self, buffer_size, uniform_sample_prob=1e-3):
-        super(PERBuffer, self).__init__(buffer_size)
-        self.tree_size = (self.buffer_size * 2) - 1
-        self.first_leaf_index = self.buffer_size - 1
+    def __init__(
+        self,
+        buffer_size,
+        uniform_sample_prob=1e-3,
+        stack_frame=None,
+        buffer_path=None,
+    ):
+        # sum tree should be defined before opening buffer from buffer_path.
+        self.tree_size = (buffer_size * 2) - 1
+        self.first_leaf_index = buffer_size - 1
 
         self.sum_tree = np.zeros(self.tree_size)  # define sum tree
         self.tree_index = self.first_leaf_index  # define sum_tree leaf node index.
 
         self.max_priority = 1.0
         self.uniform_sample_prob = uniform_sample_prob
+        super(PERBuffer, self).__init__(buffer_size, stack_frame, buffer_path)
 
     def store(self, transitions):
-        if self.first_store:
-            self.check_dim(transitions[0])
-
-        for transition in transitions:
-            self.buffer[self.buffer_index] = transition
-            new_priority = (
-                transition["priority"]
-                if "priority" in transition
-                else self.max_priority
-            )
-            self.add_tree_data(new_priority)
-
-            self.buffer_counter = min(self.buffer_counter + 1, self.buffer_size)
-            self.buffer_index = (self.buffer_index + 1) % self.buffer_size
-
-    def add_tree_data(self, new_priority):
-        self.update_priority(new_priority, self.tree_index)
-
-        self.tree_index += 1  # count current sum_tree index
-        if self.tree_index == self.tree_size:  # if sum tree index achive last index.
-            self.tree_index = self.first_leaf_index  # change frist leaf node index.
+        super(PERBuffer, self).store(transitions)
+
+        new_priorities = [
+            np.asarray(transition["priority"]).item()
+            if "priority" in transition
+            else self.max_priority
+            for transition in transitions
+        ]
+        self.add_tree_data(new_priorities)
+
+    def add_tree_data(self, new_priorities):
+        num_priorities = len(new_priorities)
+        if num_priorities == 0:
+            return
+
+        offsets = (self.tree_index - self.first_leaf_index) + np.arange(num_priorities)
+        indices = offsets % self.buffer_size + self.first_leaf_index
+        self.update_priorities(indices, new_priorities)
+
+        # count current sum_tree index, and go back to first leaf node at the end.
+        self.tree_index = int(indices[-1]) + 1
+        if self.tree_index == self.tree_size:
+            self.tree_index = self.first_leaf_index
 
     def update_priority(self, new_priority, index):
-        ex_priority = self.sum_tree[index]
-        delta_priority = new_priority - ex_priority
-        self.sum_tree[index] = new_priority
-        self.update_tree(index, delta_priority)
-
-        self.max_priority = max(self.max_priority, new_priority)
-
-    def update_tree(self, index, delta_priority):
-        # index is a starting leaf node point.
-        while index > 0:
-            index = (index - 1) // 2  # parent node index.
-            self.sum_tree[index] += delta_priority
-
-    def search_tree(self, num):
-        index = 0  # always start from root index.
-        while index < self.first_leaf_index:
-            left = (index * 2) + 1
-            right = (index * 2) + 2
-
-            if num <= self.sum_tree[left]:  # if child left node is over current value.
-                index = left  # go to the left direction.
-            else:
-                num -= self.sum_tree[left]  # if child left node is under current value.
-                index = right  # go to the right direction.
-
-        return index
+        self.update_priorities([index], [new_priority])
+
+    def update_priorities(self, indices, new_priorities):
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        new_priorities = np.asarray(new_priorities, dtype=np.float64).ravel()
+        assert len(indices) == len(new_priorities)
+
+        # if an index is duplicated, the last priority is applied.
+        self.sum_tree[indices] = new_priorities
+        self.update_tree(indices)
+
+        self.max_priority = max(self.max_priority, np.max(new_priorities))
+
+    def update_tree(self, indices):
+        # indices are starting leaf node points.
+        # parent nodes are recalculated level by level from their children,
+        # so a node shared by several leaves is only updated once per level.
+        indices = np.unique(indices[indices > 0])
+        while len(indices) > 0:
+            indices = np.unique((indices - 1) // 2)  # parent node indices.
+            self.sum_tree[indices] = (
+                self.sum_tree[(indices * 2) + 1] + self.sum_tree[(indices * 2) + 2]
+            )
+            indices = indices[indices > 0]
+
+    def search_tree(self, nums):
+        nums = np.array(nums, dtype=np.float64)
+        indices = np.zeros(len(nums), dtype=np.int64)  # always start from root index.
+        # all targets go down together, leaf nodes can lie on two different levels.
+        while True:
+            is_parent = indices < self.first_leaf_index
+            if not is_parent.any():
+                break
+
+            left = (indices[is_parent] * 2) + 1
+            right = (indices[is_parent] * 2) + 2
+            left_sum = self.sum_tree[left]
+            num = nums[is_parent]
+
+            # if child left node is over current value, go to the left direction.
+            # if child left node is under current value, go to the right direction.
+            go_left = num <= left_sum
+            indices[is_parent] = np.where(go_left, left, right)
+            nums[is_parent] = np.where(go_left, num, num - left_sum)
+
+        return indices
 
     def sample(self, beta, batch_size):
         assert self.sum_tree[0] > 0.0
@@ -73,16 +102,16 @@ class PERBuffer(ReplayBuffer):
         uniform_size = np.sum(uniform_sampling)
         prioritized_size = batch_size - uniform_size
 
-        uniform_indices = list(
+        uniform_indices = (
             np.random.randint(self.buffer_counter, size=uniform_size)
             + self.first_leaf_index
         )
 
         targets = np.random.uniform(size=prioritized_size) * self.sum_tree[0]
-        prioritized_indices = [self.search_tree(target) for target in targets]
+        prioritized_indices = self.search_tree(targets)
 
-        indices = np.asarray(uniform_indices + prioritized_indices)
-        priorities = np.asarray([self.sum_tree[index] for index in indices])
+        indices = np.concatenate((uniform_indices, prioritized_indices))
+        priorities = self.sum_tree[indices]
         assert len(indices) == len(priorities) == batch_size
 
         uniform_probs = np.asarray(1.0 / self.buffer_counter)
@@ -92,14 +121,29 @@ class PERBuffer(ReplayBuffer):
         sample_probs = (1.0 - usp) * prioritized_probs + usp * uniform_probs
         weights = (uniform_probs / sample_probs) ** beta
         weights /= np.max(weights)
-        batch = [self.buffer[idx] for idx in indices - self.first_leaf_index]
-
-        transitions = self.stack_transition(batch)
+        transitions = self.read(indices - self.first_leaf_index)
 
         sampled_p = np.mean(priorities)
         mean_p = self.sum_tree[0] / self.buffer_counter
         return transitions, weights, indices, sampled_p, mean_p
 
+    def state_dict(self):
+        state = super(PERBuffer, self).state_dict()
+        state.update(
+            {
+                "sum_tree": self.sum_tree,
+                "tree_index": self.tree_index,
+                "max_priority": self.max_priority,
+            }
+        )
+        return state
+
+    def load_state_dict(self, state):
+        super(PERBuffer, self).load_state_dict(state)
+        self.sum_tree = state["sum_tree"]
+        self.tree_index = state["tree_index"]
+        self.max_priority = state["max_priority"]
+
     @property
     def size(self):
         return self.buffer_counter
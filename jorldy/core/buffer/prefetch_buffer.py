@@ -0,0 +1,109 @@
+from threading import Thread, Lock, Event
+from queue import Queue, Empty, Full
+
+from .base import BaseBuffer
+
+
+class PrefetchBuffer(BaseBuffer):
+    """Wrapper of buffer which prepares next batches in background thread.
+
+    Sampling and transform (e.g. conversion to tensor) of the next batches are done in
+    a worker thread while the current batch is used for learning. Store and priority
+    update are applied to the wrapped buffer between samplings of the worker, and the
+    other attributes of the wrapped buffer are accessed as they are.
+
+    Args:
+        memory (BaseBuffer): buffer to sample batches from.
+        num_prefetch (int): the number of batches prepared in advance.
+        transform (function): function to apply to transitions of a sampled batch.
+    """
+
+    def __init__(self, memory, num_prefetch, transform=None):
+        super(PrefetchBuffer, self).__init__()
+        self.memory = memory
+        self.num_prefetch = num_prefetch
+        self.transform = transform
+
+        self.lock = Lock()
+        self.batch_queue = Queue(num_prefetch)
+        self.stop_event = Event()
+        self.sample_args = None
+        self.prefetch_thread = None
+
+    def __getattr__(self, name):
+        if name == "memory":
+            raise AttributeError(name)
+        return getattr(self.memory, name)
+
+    def store(self, transitions):
+        with self.lock:
+            self.memory.store(transitions)
+
+    def sample(self, *args):
+        """
+        Return the next prefetched batch. Arguments of the latest call are used to
+        sample the following batches. (e.g. annealed beta of PERBuffer)
+        """
+        self.sample_args = args
+        if self.prefetch_thread is None:
+            self.prefetch_thread = Thread(target=self.prefetch, daemon=True)
+            self.prefetch_thread.start()
+
+        batch, error = self.batch_queue.get()
+        if error is not None:
+            raise error
+        return batch
+
+    def prefetch(self):
+        while not self.stop_event.is_set():
+            try:
+                with self.lock:
+                    batch = self.memory.sample(*self.sample_args)
+                transitions = batch[0] if isinstance(batch, tuple) else batch
+                if self.transform is not None:
+                    self.transform(transitions)
+                item = (batch, None)
+            except Exception as e:
+                item = (None, e)
+
+            while not self.stop_event.is_set():
+                try:
+                    self.batch_queue.put(item, timeout=0.1)
+                    break
+                except Full:
+                    pass
+            if item[1] is not None:
+                break
+
+        self.prefetch_thread = None
+
+    def update_priority(self, new_priority, index):
+        with self.lock:
+            self.memory.update_priority(new_priority, index)
+
+    def update_priorities(self, indices, new_priorities):
+        """
+        Update priorities of the wrapped buffer. Batches prefetched before the update
+        are sampled with the previous priorities.
+        """
+        with self.lock:
+            self.memory.update_priorities(indices, new_priorities)
+
+    def stop(self):
+        """
+        Stop background thread and discard prefetched batches.
+        """
+        self.stop_event.set()
+        thread = self.prefetch_thread
+        if thread is not None:
+            thread.join()
+        while True:
+            try:
+                self.batch_queue.get_nowait()
+            except Empty:
+                break
+        self.stop_event.clear()
+
+    @property
+    def size(self):
+        return self.memory.size
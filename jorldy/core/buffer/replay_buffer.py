@@ -1,35 +1,324 @@
-from collections import deque
-import random
+import os, copy, shutil
+import pickle
+from threading import Thread
 import numpy as np
 
 from .base import BaseBuffer
+from .frame_storage import FrameStorage
 
 
 class ReplayBuffer(BaseBuffer):
-    def __init__(self, buffer_size):
+    def __init__(self, buffer_size, stack_frame=None, buffer_path=None):
         super(ReplayBuffer, self).__init__()
-        self.buffer = np.zeros(buffer_size, dtype=dict)  # define replay buffer
+        self.buffer = dict()  # define replay buffer (allocated at first store)
         self.buffer_index = 0
         self.buffer_size = buffer_size
         self.buffer_counter = 0
 
+        # store each frame of stacked-frame states only once
+        self.stack_frame = stack_frame
+        self.frame_keys = []
+        self.frame_storage = (
+            FrameStorage(buffer_size, stack_frame, self.allocate, self.resize)
+            if stack_frame
+            else None
+        )
+
+        # snapshot of buffer is written in background thread
+        self.save_thread = None
+        self.snapshot_chunk_size = 4096
+
+        # keep transition data in memory-mapped files under buffer_path
+        self.buffer_path = buffer_path
+        self.columns = dict()  # name of column -> (shape, dtype)
+        if buffer_path is not None:
+            os.makedirs(buffer_path, exist_ok=True)
+            if os.path.exists(self.index_path):
+                self.open_buffer()
+
     def store(self, transitions):
         if self.first_store:
             self.check_dim(transitions[0])
 
-        for transition in transitions:
-            self.buffer[self.buffer_index] = transition
-            self.buffer_index = (self.buffer_index + 1) % self.buffer_size
-            self.buffer_counter = min(self.buffer_counter + 1, self.buffer_size)
+        if self.save_thread is not None and not self.save_thread.is_alive():
+            self.wait_save()
+
+        num_transitions = len(transitions)
+        if num_transitions == 0:
+            return
+
+        # only the latest transitions as much as buffer size survive in buffer
+        transitions = transitions[-self.buffer_size :]
+        start = (self.buffer_index + num_transitions - len(transitions)) % (
+            self.buffer_size
+        )
+        self.write(transitions, start)
+
+        self.buffer_index = (self.buffer_index + num_transitions) % self.buffer_size
+        self.buffer_counter = min(
+            self.buffer_counter + num_transitions, self.buffer_size
+        )
 
     def sample(self, batch_size):
         batch_idx = np.random.randint(self.buffer_counter, size=batch_size)
-        batch = self.buffer[batch_idx]
+        transitions = self.read(batch_idx)
+
+        return transitions
+
+    def allocate(self, name, shape, dtype, length=None):
+        shape = (length if length else self.buffer_size, *shape)
+        self.columns[name] = (shape, np.dtype(dtype).str)
+        if self.buffer_path is None:
+            return np.zeros(shape, dtype=dtype)
+        return self.open_memmap(name, "w+")
+
+    def resize(self, name, column, length):
+        shape = (length, *column.shape[1:])
+        self.columns[name] = (shape, column.dtype.str)
+        if self.buffer_path is None:
+            extra = np.zeros((length - len(column), *column.shape[1:]), column.dtype)
+            return np.concatenate((column, extra))
+        # memory-mapped file is extended without copy
+        column.flush()
+        return self.open_memmap(name, "r+")
+
+    def open_memmap(self, name, mode):
+        shape, dtype = self.columns[name]
+        path = os.path.join(self.buffer_path, f"{name}.dat")
+        return np.memmap(path, dtype=np.dtype(dtype), mode=mode, shape=shape)
 
-        transitions = self.stack_transition(batch)
+    def allocate_buffer(self, transition):
+        for key, val in transition.items():
+            if self.is_frame_key(key, val):
+                self.frame_keys.append(key)
+                self.buffer[key] = self.allocate(key, (self.stack_frame,), np.int64)
+                self.buffer[key][:] = -1
+            elif isinstance(val, list):
+                # Multimodal
+                self.buffer[key] = [
+                    self.allocate(f"{key}{i}", v.shape[1:], v.dtype)
+                    for i, v in enumerate(map(np.asarray, val))
+                ]
+            else:
+                val = np.asarray(val)
+                self.buffer[key] = self.allocate(key, val.shape[1:], val.dtype)
+
+    def write(self, transitions, index):
+        if not self.buffer:
+            self.allocate_buffer(transitions[0])
+
+        for key, storage in self.buffer.items():
+            if isinstance(storage, list):
+                for i in range(len(storage)):
+                    values = np.concatenate([t[key][i] for t in transitions], axis=0)
+                    self.write_column(f"{key}{i}", storage, i, values, index)
+            else:
+                values = np.concatenate([t[key] for t in transitions], axis=0)
+                if key in self.frame_keys:
+                    slots = (index + np.arange(len(values))) % self.buffer_size
+                    self.frame_storage.release(storage[slots])
+                    values = self.frame_storage.store(values)
+                self.write_column(key, self.buffer, key, values, index)
+
+    def is_frame_key(self, key, val):
+        return (
+            self.frame_storage is not None
+            and key in ["state", "next_state"]
+            and isinstance(val, np.ndarray)
+            and val.ndim == 4
+            and val.shape[1] % self.stack_frame == 0
+        )
+
+    def write_column(self, name, container, slot, values, index):
+        column = container[slot]
+        if not np.can_cast(values.dtype, column.dtype):
+            dtype = np.promote_types(values.dtype, column.dtype)
+            prev_column = np.array(column)
+            column = self.allocate(name, column.shape[1:], dtype)
+            column[:] = prev_column
+            container[slot] = column
+
+        # slice assignment with wrap around at the end of buffer
+        n_front = min(len(values), self.buffer_size - index)
+        column[index : index + n_front] = values[:n_front]
+        column[: len(values) - n_front] = values[n_front:]
+
+    def read(self, indices):
+        transitions = {}
+        for key, storage in self.buffer.items():
+            if key in self.frame_keys:
+                transitions[key] = self.frame_storage.read(storage[indices])
+            elif isinstance(storage, list):
+                transitions[key] = [column[indices] for column in storage]
+            else:
+                transitions[key] = storage[indices]
 
         return transitions
 
+    @property
+    def index_path(self):
+        return os.path.join(self.buffer_path, "index.pkl")
+
+    def state_dict(self):
+        state = {
+            "buffer_size": self.buffer_size,
+            "buffer_index": self.buffer_index,
+            "buffer_counter": self.buffer_counter,
+            "first_store": self.first_store,
+            "keys": {
+                key: len(storage) if isinstance(storage, list) else None
+                for key, storage in self.buffer.items()
+            },
+            "frame_keys": self.frame_keys,
+            "columns": self.columns,
+        }
+        if self.frame_storage is not None:
+            state["frame_storage"] = self.frame_storage.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        assert state["buffer_size"] == self.buffer_size
+        self.buffer_index = state["buffer_index"]
+        self.buffer_counter = state["buffer_counter"]
+        self.first_store = state["first_store"]
+        self.frame_keys = state["frame_keys"]
+        self.columns = state["columns"]
+        if self.frame_storage is not None:
+            self.frame_storage.load_state_dict(state["frame_storage"])
+
+    def get_columns(self):
+        columns = dict()
+        for key, storage in self.buffer.items():
+            if isinstance(storage, list):
+                for i, column in enumerate(storage):
+                    columns[f"{key}{i}"] = column
+            else:
+                columns[key] = storage
+        if self.frame_storage is not None and self.frame_storage.frames is not None:
+            columns["frames"] = self.frame_storage.frames
+        return columns
+
+    def set_columns(self, keys, get_column):
+        for key, num_modal in keys.items():
+            if num_modal is None:
+                self.buffer[key] = get_column(key)
+            else:
+                self.buffer[key] = [get_column(f"{key}{i}") for i in range(num_modal)]
+        if self.frame_storage is not None and "frames" in self.columns:
+            self.frame_storage.frames = get_column("frames")
+
+    def flush(self):
+        """
+        Write memory-mapped buffer and its index (cursor, priorities, ...) to disk.
+        """
+        if self.buffer_path is None:
+            return
+
+        for column in self.get_columns().values():
+            column.flush()
+
+        with open(self.index_path, "wb") as f:
+            pickle.dump(self.state_dict(), f)
+
+    def open_buffer(self):
+        with open(self.index_path, "rb") as f:
+            state = pickle.load(f)
+        self.load_state_dict(state)
+        self.set_columns(state["keys"], lambda name: self.open_memmap(name, "r+"))
+
+        print(f"...Open buffer from {self.buffer_path} ({self.size} transitions)...")
+
+    def save(self, path, compress=False):
+        """
+        Save snapshot of buffer to path. Transition data is written in a background
+        thread, so transitions stored while writing may be included in the snapshot.
+
+        Parameter Type
+        - path:     str, directory of the snapshot.
+        - compress: bool, whether to compress the snapshot. (it can not be memory-mapped)
+        """
+        self.wait_save()
+
+        # index and frame indices are copied, and freed frames are held while writing.
+        state = copy.deepcopy(self.state_dict())
+        columns = self.get_columns()
+        for key in self.frame_keys:
+            columns[key] = columns[key].copy()
+        if self.frame_storage is not None:
+            self.frame_storage.hold()
+
+        self.save_thread = Thread(
+            target=self.write_snapshot, args=(path, state, columns, compress)
+        )
+        self.save_thread.start()
+
+    def write_snapshot(self, path, state, columns, compress):
+        tmp_path, old_path = f"{path}.tmp", f"{path}.old"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        for name, column in columns.items():
+            # empty rows are not saved except frame pool
+            if name != "frames":
+                column = column[: state["buffer_counter"]]
+            file_path = os.path.join(tmp_path, name)
+            if compress:
+                with open(f"{file_path}.npz", "wb") as f:
+                    np.savez_compressed(f, column=column)
+            else:
+                out = np.lib.format.open_memmap(
+                    f"{file_path}.npy", "w+", column.dtype, column.shape
+                )
+                chunk = self.snapshot_chunk_size
+                for i in range(0, len(column), chunk):
+                    out[i : i + chunk] = column[i : i + chunk]
+                out.flush()
+                del out
+
+        with open(os.path.join(tmp_path, "index.pkl"), "wb") as f:
+            pickle.dump(state, f)
+
+        # replace previous snapshot. (memory-mapped files of it remain valid)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def wait_save(self):
+        if self.save_thread is not None:
+            self.save_thread.join()
+            self.save_thread = None
+            if self.frame_storage is not None:
+                self.frame_storage.unhold()
+
+    def load(self, path):
+        """
+        Load snapshot of buffer from path. Uncompressed snapshot is memory-mapped
+        with copy-on-write, so data is read from disk only when it is used.
+        """
+        self.wait_save()
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            state = pickle.load(f)
+        self.load_state_dict(state)
+        self.set_columns(state["keys"], lambda name: self.load_column(path, name))
+
+        print(f"...Load buffer from {path} ({self.size} transitions)...")
+
+    def load_column(self, path, name):
+        file_path = os.path.join(path, name)
+        if os.path.exists(f"{file_path}.npy"):
+            saved = np.load(f"{file_path}.npy", mmap_mode="c")
+        else:
+            saved = np.load(f"{file_path}.npz")["column"]
+
+        shape, dtype = self.columns[name]
+        if self.buffer_path is None and saved.shape == shape:
+            return saved
+
+        column = self.allocate(name, shape[1:], dtype, shape[0])
+        column[: len(saved)] = saved
+        return column
+
     @property
     def size(self):
         return self.buffer_counter
@@ -4,21 +4,173 @@ from .base import BaseBuffer
 
 
 class RolloutBuffer(BaseBuffer):
-    def __init__(self):
+    """Rollout buffer which keeps consecutive steps of each worker in rows.
+
+    Transitions are written into preallocated arrays of (rows, n_step, ...), where a
+    row is filled with n_step consecutive transitions of one worker. (identified by
+    "worker" of transition, 0 if it is not given) Sample returns completed rows in the
+    order of creation, so consecutive n_step transitions of the batch always belong to
+    one worker. Rows not completed yet remain in buffer for the next sample.
+    If n_step is None, transitions are written in a single growing row. (e.g. episode)
+
+    Args:
+        n_step (int): the number of steps in one row.
+        num_workers (int): the number of rows allocated at first. (it grows if needed)
+    """
+
+    def __init__(self, n_step=None, num_workers=1):
         super(RolloutBuffer, self).__init__()
-        self.buffer = list()
+        self.n_step = n_step
+        self.buffer = dict()  # allocated at first store
+        self.row_size = n_step if n_step else 128
+        self.num_rows = max(num_workers, 1)
+        self.row_len = np.zeros(self.num_rows, dtype=np.int64)
+        self.row_used = 0  # the number of rows in use
+        self.open_rows = dict()  # worker -> row being filled
+        self.sampled_rows = None  # rows returned by last sample
 
     def store(self, transitions):
         if self.first_store:
             self.check_dim(transitions[0])
-        self.buffer += transitions
+        self.drop_sampled()
+
+        workers = [
+            int(np.asarray(t["worker"]).item())
+            if "worker" in t and self.n_step is not None
+            else 0
+            for t in transitions
+        ]
+        for worker in dict.fromkeys(workers):
+            group = [t for t, w in zip(transitions, workers) if w == worker]
+            values = {
+                key: [
+                    np.concatenate([t[key][i] for t in group]) for i in range(len(val))
+                ]
+                if isinstance(val, list)
+                else np.concatenate([t[key] for t in group])
+                for key, val in group[0].items()
+                if key != "worker"
+            }
+            if not self.buffer:
+                self.allocate(values)
+            self.write(worker, values, len(group))
+
+    def allocate(self, values):
+        def allocate_column(val):
+            shape = (self.num_rows, self.row_size, *val.shape[1:])
+            return np.zeros(shape, dtype=val.dtype)
+
+        for key, val in values.items():
+            self.buffer[key] = (
+                list(map(allocate_column, val))
+                if isinstance(val, list)
+                else allocate_column(val)
+            )
+
+    def write(self, worker, values, num_values):
+        written = 0
+        while written < num_values:
+            if worker not in self.open_rows:
+                self.open_rows[worker] = self.add_row()
+            row = self.open_rows[worker]
+
+            start = self.row_len[row]
+            if self.n_step is None and start + num_values - written > self.row_size:
+                self.resize(self.row_size * 2, axis=1)
+            num = min(self.row_size - start, num_values - written)
+            for key, val in values.items():
+                for column, v in self.columns(key, val):
+                    column[row, start : start + num] = v[written : written + num]
+
+            self.row_len[row] += num
+            written += num
+            if self.row_len[row] == self.n_step:
+                del self.open_rows[worker]
+
+    def columns(self, key, val):
+        if isinstance(val, list):
+            return zip(self.buffer[key], val)
+        return [(self.buffer[key], val)]
+
+    def add_row(self):
+        if self.row_used == self.num_rows:
+            self.resize(self.num_rows * 2, axis=0)
+        self.row_used += 1
+        return self.row_used - 1
+
+    def resize(self, length, axis):
+        def resize_column(column):
+            shape = list(column.shape)
+            shape[axis] = length - shape[axis]
+            return np.concatenate((column, np.zeros(shape, column.dtype)), axis=axis)
+
+        for key, storage in self.buffer.items():
+            self.buffer[key] = (
+                list(map(resize_column, storage))
+                if isinstance(storage, list)
+                else resize_column(storage)
+            )
+        if axis == 0:
+            self.row_len = np.concatenate(
+                (self.row_len, np.zeros(length - self.num_rows, np.int64))
+            )
+            self.num_rows = length
+        else:
+            self.row_size = length
 
     def sample(self):
-        transitions = self.stack_transition(self.buffer)
+        """
+        Return transitions of completed rows, flattened in worker-major order.
+        Arrays are views of buffer if the completed rows are the first rows.
+
+        Parameter Type / Shape
+        - transitions: dict / (N_row * n_step, ...) ex) state: (8 * 128, 4)
+        """
+        if self.n_step is None:
+            rows = np.arange(self.row_used)
+            length = self.row_len[0] if self.row_used else 0
+        else:
+            rows = np.flatnonzero(self.row_len[: self.row_used] == self.n_step)
+            length = self.n_step
+
+        def read(column):
+            if len(rows) > 0 and rows[-1] == len(rows) - 1:
+                column = column[: len(rows), :length]
+            else:
+                column = column[rows, :length]
+            return column.reshape(-1, *column.shape[2:])
 
-        self.buffer.clear()
+        transitions = {}
+        for key, storage in self.buffer.items():
+            transitions[key] = (
+                list(map(read, storage)) if isinstance(storage, list) else read(storage)
+            )
+
+        self.sampled_rows = rows
         return transitions
 
+    def drop_sampled(self):
+        # sampled rows are removed lazily, so that sampled arrays are valid until next store.
+        if self.sampled_rows is None:
+            return
+
+        keep = np.setdiff1d(np.arange(self.row_used), self.sampled_rows)
+        for key, storage in self.buffer.items():
+            for column in storage if isinstance(storage, list) else [storage]:
+                column[: len(keep)] = column[keep]
+
+        new_rows = dict(zip(keep.tolist(), range(len(keep))))
+        self.open_rows = {
+            w: new_rows[row] for w, row in self.open_rows.items() if row in new_rows
+        }
+        self.row_len[: len(keep)] = self.row_len[keep]
+        self.row_len[len(keep) :] = 0
+        self.row_used = len(keep)
+        self.sampled_rows = None
+
     @property
     def size(self):
-        return len(self.buffer)
+        size = np.sum(self.row_len[: self.row_used])
+        if self.sampled_rows is not None:
+            size -= np.sum(self.row_len[self.sampled_rows])
+        return int(size)
@@ -0,0 +1,132 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+from .replay_buffer import ReplayBuffer
+from .frame_storage import FrameStorage
+
+
+class SharedReplayBuffer(ReplayBuffer):
+    """Replay buffer whose columns live in shared memory.
+
+    One process (writer) stores transitions as in ReplayBuffer, and the other
+    processes (readers) attach to the same memory with handle of the writer. So only
+    handle (cursor and names of shared memory) is sent between processes instead of
+    transitions. The writer owns cursor of buffer, and a reader only applies the
+    latest handle by store, then samples from the shared memory without copy.
+
+    Args:
+        buffer_size (int): the size of the buffer.
+        stack_frame (int): the number of stacked frames in one single state.
+    """
+
+    def __init__(self, buffer_size, stack_frame=None):
+        super(SharedReplayBuffer, self).__init__(buffer_size, stack_frame)
+        self.segments = dict()  # name of column -> shared memory
+        self.retired_segments = []  # replaced shared memory (resized or promoted)
+
+    def store(self, transitions):
+        # reader: transitions are handles of writer
+        if len(transitions) > 0 and "shared_buffer" in transitions[-1]:
+            self.attach(transitions[-1]["shared_buffer"])
+            return
+
+        super(SharedReplayBuffer, self).store(transitions)
+
+    def allocate(self, name, shape, dtype, length=None):
+        shape = (length if length else self.buffer_size, *shape)
+        dtype = np.dtype(dtype)
+        nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        segment = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.replace_segment(name, segment)
+        self.columns[name] = (shape, dtype.str)
+        return np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+    def resize(self, name, column, length):
+        resized = self.allocate(name, column.shape[1:], column.dtype, length)
+        resized[: len(column)] = column
+        return resized
+
+    def replace_segment(self, name, segment):
+        # replaced memory is unlinked at close, because a handle in flight may refer it.
+        if name in self.segments:
+            self.retired_segments.append(self.segments[name])
+        self.segments[name] = segment
+
+    def handle(self):
+        """
+        Return handle of buffer which is sent to readers instead of transitions.
+
+        Parameter Type
+        - handle: Dict, {"shared_buffer": cursor, layout and names of shared memory}
+        """
+        return {
+            "shared_buffer": {
+                "buffer_size": self.buffer_size,
+                "stack_frame": self.stack_frame,
+                "buffer_index": self.buffer_index,
+                "buffer_counter": self.buffer_counter,
+                "keys": {
+                    key: len(storage) if isinstance(storage, list) else None
+                    for key, storage in self.buffer.items()
+                },
+                "frame_keys": self.frame_keys,
+                "columns": dict(self.columns),
+                "segments": {name: seg.name for name, seg in self.segments.items()},
+            }
+        }
+
+    def attach(self, handle):
+        assert handle["buffer_size"] == self.buffer_size
+        try:
+            attached = {
+                name: shared_memory.SharedMemory(name=segment_name)
+                for name, segment_name in handle["segments"].items()
+                if name not in self.segments or self.segments[name].name != segment_name
+            }
+        except FileNotFoundError:
+            # stale handle refers to unlinked memory, the next handle is up to date.
+            return
+
+        for name, segment in attached.items():
+            self.replace_segment(name, segment)
+        self.columns = handle["columns"]
+
+        if "frames" in self.columns and self.frame_storage is None:
+            self.stack_frame = handle["stack_frame"]
+            self.frame_storage = FrameStorage(self.buffer_size, self.stack_frame)
+        self.set_columns(handle["keys"], self.view_column)
+
+        self.frame_keys = handle["frame_keys"]
+        self.buffer_index = handle["buffer_index"]
+        self.buffer_counter = handle["buffer_counter"]
+        self.first_store = False
+
+    def view_column(self, name):
+        shape, dtype = self.columns[name]
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.segments[name].buf)
+
+    def close(self, unlink=False):
+        """
+        Close shared memory of buffer. Replaced memory is unlinked always, and memory
+        in use is unlinked only if unlink is True. (it should be done by the last user)
+        """
+        self.buffer = dict()
+        if self.frame_storage is not None:
+            self.frame_storage.frames = None
+
+        for segment in self.retired_segments:
+            self.release_segment(segment, True)
+        for segment in self.segments.values():
+            self.release_segment(segment, unlink)
+        self.segments, self.retired_segments = dict(), []
+
+    def release_segment(self, segment, unlink):
+        try:
+            segment.close()
+        except BufferError:
+            pass  # sampled views are still alive, it is closed with them.
+        if unlink:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,6 +1,8 @@
 import os, sys, inspect, re, traceback
 from collections import OrderedDict
 
+from .vec_env import VecEnv, SubprocVecEnv, AsyncEnvPool
+
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # for import mlagents
 
 working_path = os.path.dirname(os.path.realpath(__file__))
@@ -9,7 +11,7 @@ module_list = [
     file.replace(".py", "")
     for file in file_list
     if file.endswith(".py")
-    and file.replace(".py", "") not in ["__init__", "base", "utils"]
+    and file.replace(".py", "") not in ["__init__", "base", "utils", "vec_env"]
 ]
 env_dict = {}
 error_dict = {}
@@ -0,0 +1,428 @@
+import os
+import traceback
+from collections import deque
+import multiprocessing as mp
+from multiprocessing import connection, shared_memory, resource_tracker
+import numpy as np
+
+
+class VecEnv:
+    """Vectorized environment which steps N instances of an env together.
+
+    States, rewards and dones of the sub-envs are stacked along the batch axis, so
+    one forward pass of agent serves all sub-envs. A finished sub-env is reset in step
+    automatically, and the state to act on at the next step is kept in state.
+    The other attributes (e.g. state_size, action_type) are those of the first sub-env.
+
+    Args:
+        Env (class): class of environment. (or function which returns environment)
+        env_config (dict): keyword arguments of Env.
+        num_envs (int): the number of sub-envs.
+        id (int): id of the first sub-env, the others have consecutive ids.
+    """
+
+    def __init__(self, Env, env_config, num_envs=1, id=None):
+        self.num_envs = num_envs if num_envs else 1
+        self.envs = []
+        for i in range(self.num_envs):
+            if id is None:
+                self.envs.append(Env(**env_config))
+            else:
+                self.envs.append(Env(id=id + i, **env_config))
+
+        self.state = None
+        self.score = np.zeros(self.num_envs)
+        # score of the last finished episode of each sub-env (nan until finished)
+        self.episode_score = np.full(self.num_envs, np.nan)
+
+    def __getattr__(self, name):
+        if name == "envs":
+            raise AttributeError(name)
+        return getattr(self.envs[0], name)
+
+    def reset(self):
+        """
+        Reset all sub-envs and return stacked initial states.
+
+        Parameter Type / Shape
+        - state: ndarray / (N_env, D_state) ex) (8, 4), (8, 4, 84, 84)
+        """
+        self.state = self.stack([env.reset() for env in self.envs])
+        self.score[:] = 0
+        return self.state
+
+    def step(self, action):
+        """
+        Step all sub-envs with their actions. next_state of a finished sub-env is its
+        terminal state, and state is updated with the initial state of the new episode.
+
+        Parameter Type / Shape
+        - action:       ndarray / (N_env, *D_action) ex) (8, 3), (8, 1)
+        - next_state:   ndarray / (N_env, D_state) ex) (8, 4), (8, 4, 84, 84)
+        - reward:       ndarray / (N_env, D_reward) ex) (8, 1)
+        - done:         ndarray / (N_env, D_done) ex) (8, 1)
+        """
+        results = [env.step(action[i : i + 1]) for i, env in enumerate(self.envs)]
+        next_states, rewards, dones = zip(*results)
+        next_state = self.stack(next_states)
+        reward, done = np.concatenate(rewards), np.concatenate(dones)
+        self.update_score([env.score for env in self.envs], done)
+
+        states = [
+            env.reset() if d.any() else s
+            for env, s, d in zip(self.envs, next_states, done)
+        ]
+        self.state = self.stack(states) if done.any() else next_state
+
+        return next_state, reward, done
+
+    def update_score(self, score, done, env_id=None):
+        env_id = np.arange(self.num_envs) if env_id is None else env_id
+        finished = env_id[done.reshape(len(env_id), -1).any(axis=1)]
+        self.score[env_id] = score
+        self.episode_score[finished] = self.score[finished]
+        self.score[finished] = 0
+
+    def stack(self, states):
+        if isinstance(states[0], list):  # multi-modal state
+            return [np.concatenate(s) for s in zip(*states)]
+        return np.concatenate(states)
+
+    def unstack(self, transition):
+        """
+        Split stacked transition into transitions of each sub-env.
+
+        Parameter Type / Shape
+        - transition:   dict / values of (N_env, ...)
+        - transitions:  list of dict / values of (1, ...)
+        """
+        val = next(iter(transition.values()))
+        num_envs = len(val[0]) if isinstance(val, list) else len(val)
+        transitions = [{} for _ in range(num_envs)]
+        for key, val in transition.items():
+            for i in range(num_envs):
+                if isinstance(val, list):
+                    transitions[i][key] = [v[i : i + 1] for v in val]
+                else:
+                    transitions[i][key] = val[i : i + 1]
+        return transitions
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+class SubprocVecEnv(VecEnv):
+    """Vectorized environment whose sub-envs run in worker processes.
+
+    Sub-envs are split into groups, and each group is stepped by its own worker
+    process, so CPU-heavy envs run on several cores without Ray. Workers write states
+    into preallocated shared memory, and only actions, rewards and dones are sent
+    through pipes. Plain attributes of the first sub-env (e.g. state_size) are copied
+    to the main process at start.
+
+    Args:
+        Env (class): class of environment. (or function which returns environment)
+        env_config (dict): keyword arguments of Env.
+        num_envs (int): the number of sub-envs.
+        num_processes (int): the number of worker processes. (None: the number of cpus)
+        id (int): id of the first sub-env, the others have consecutive ids.
+    """
+
+    def __init__(self, Env, env_config, num_envs=1, num_processes=None, id=None):
+        self.num_envs = num_envs if num_envs else 1
+        num_processes = min(num_processes or os.cpu_count(), self.num_envs)
+        self.groups = np.array_split(np.arange(self.num_envs), num_processes)
+
+        # workers share resource tracker of main process, so memory is unlinked once.
+        resource_tracker.ensure_running()
+        self.conns, self.processes = [], []
+        for group in self.groups:
+            ids = [None if id is None else id + i for i in group]
+            conn, worker_conn = mp.Pipe()
+            process = mp.Process(
+                target=env_worker,
+                args=(Env, dict(env_config), ids, int(group[0]), worker_conn),
+                daemon=True,
+            )
+            process.start()
+            worker_conn.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+        self.attrs, state = self.receive()[0]
+        self.multi_modal = isinstance(state, list)
+        self.segments = []
+        self.next_states = self.allocate(state)  # next_state returned by step
+        self.reset_states = self.allocate(state)  # initial state of a new episode
+        layout = [
+            [(seg.name, view.shape, view.dtype.str) for seg, view in views]
+            for views in (self.next_states, self.reset_states)
+        ]
+        self.send_all("attach", layout)
+        self.receive()
+
+        self.state = None
+        self.score = np.zeros(self.num_envs)
+        self.episode_score = np.full(self.num_envs, np.nan)
+
+    def __getattr__(self, name):
+        if name == "attrs":
+            raise AttributeError(name)
+        try:
+            return self.attrs[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def allocate(self, state):
+        views = []
+        for component in state if self.multi_modal else [state]:
+            shape = (self.num_envs, *component.shape[1:])
+            nbytes = max(int(np.prod(shape)) * component.dtype.itemsize, 1)
+            segment = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.segments.append(segment)
+            view = np.ndarray(shape, dtype=component.dtype, buffer=segment.buf)
+            views.append((segment, view))
+        return views
+
+    def read(self, views, rows=None):
+        # copy, because shared memory is overwritten at the next step.
+        states = [view.copy() if rows is None else view[rows] for _, view in views]
+        return states if self.multi_modal else states[0]
+
+    def send_all(self, command, data=None):
+        for conn in self.conns:
+            conn.send((command, data))
+
+    def receive(self):
+        results = []
+        for conn in self.conns:
+            result, error = conn.recv()
+            if error is not None:
+                raise RuntimeError(f"error in env worker process\n{error}")
+            results.append(result)
+        return results
+
+    def reset(self):
+        self.send_all("reset")
+        self.receive()
+        self.state = self.read(self.next_states)
+        self.score[:] = 0
+        return self.state
+
+    def step(self, action):
+        action = np.asarray(action)
+        for conn, process_action in zip(self.conns, self.split(action)):
+            conn.send(("step", process_action))
+        rewards, dones, scores = zip(*self.receive())
+        reward, done = np.concatenate(rewards), np.concatenate(dones)
+        self.update_score(np.concatenate(scores), done)
+        next_state, self.state = self.read_states(np.arange(self.num_envs), done)
+
+        return next_state, reward, done
+
+    def read_states(self, env_id, done):
+        # states to act on next are reset states for finished envs, otherwise next states.
+        next_state = self.read(self.next_states, env_id)
+        finished = np.flatnonzero(done.reshape(len(env_id), -1).any(axis=1))
+        if len(finished) == 0:
+            return next_state, next_state
+
+        reset_state = self.read(self.reset_states, env_id[finished])
+        if self.multi_modal:
+            state = [s.copy() for s in next_state]
+            for s, r in zip(state, reset_state):
+                s[finished] = r
+        else:
+            state = next_state.copy()
+            state[finished] = reset_state
+        return next_state, state
+
+    def split(self, action):
+        sizes = [len(group) for group in self.groups]
+        return np.split(action, np.cumsum(sizes)[:-1])
+
+    def close(self):
+        if not self.conns:
+            return
+        for conn, process in zip(self.conns, self.processes):
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass  # worker is already finished by error.
+            # results in flight are drained, so that worker is not blocked on sending.
+            while process.is_alive():
+                try:
+                    if conn.poll(0.1):
+                        conn.recv()
+                except (EOFError, OSError):
+                    break
+            process.join()
+            conn.close()
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.conns, self.processes, self.segments = [], [], []
+
+
+class AsyncEnvPool(SubprocVecEnv):
+    """Pool of envs in worker processes which returns results of envs ready first.
+
+    Actions are sent to some envs by send, and recv returns the results of batch_size
+    envs which finished their steps first, tagged with their env ids. So slow steps or
+    resets of some envs do not block acting of the others. A finished env is reset in
+    its worker, and the states to act on next for the returned envs are kept in state.
+
+    Args:
+        Env (class): class of environment. (or function which returns environment)
+        env_config (dict): keyword arguments of Env.
+        num_envs (int): the number of envs.
+        batch_size (int): the number of envs returned by recv. (None: num_envs // 2)
+        num_processes (int): the number of worker processes. (None: the number of cpus)
+        id (int): id of the first env, the others have consecutive ids.
+    """
+
+    def __init__(
+        self,
+        Env,
+        env_config,
+        num_envs=1,
+        batch_size=None,
+        num_processes=None,
+        id=None,
+    ):
+        num_envs = num_envs if num_envs else 1
+        num_processes = num_processes or min(os.cpu_count(), num_envs)
+        super(AsyncEnvPool, self).__init__(Env, env_config, num_envs, num_processes, id)
+        self.batch_size = batch_size if batch_size else max(self.num_envs // 2, 1)
+        assert self.batch_size <= self.num_envs
+
+        self.worker_index = np.zeros(self.num_envs, dtype=np.int64)
+        for i, group in enumerate(self.groups):
+            self.worker_index[group] = i
+        self.running = np.zeros(self.num_envs, dtype=bool)
+        self.ready = deque()  # results received but not returned yet
+
+    def send(self, action, env_id):
+        """
+        Send actions to envs of env_id. Envs of a worker are stepped in order.
+
+        Parameter Type / Shape
+        - action:   ndarray / (N_batch, *D_action) ex) (4, 3), (4, 1)
+        - env_id:   ndarray / (N_batch,)
+        """
+        env_id = np.asarray(env_id)
+        assert not self.running[env_id].any(), "result of env is not received yet."
+        for i, conn in enumerate(self.conns):
+            indices = np.flatnonzero(self.worker_index[env_id] == i)
+            if len(indices) > 0:
+                offset = self.groups[i][0]
+                data = [(env_id[j] - offset, action[j : j + 1]) for j in indices]
+                conn.send(("step_envs", data))
+        self.running[env_id] = True
+
+    def recv(self):
+        """
+        Return results of batch_size envs which finished their steps first.
+
+        Parameter Type / Shape
+        - env_id:       ndarray / (N_batch,)
+        - next_state:   ndarray / (N_batch, D_state) ex) (4, 4), (4, 4, 84, 84)
+        - reward:       ndarray / (N_batch, D_reward) ex) (4, 1)
+        - done:         ndarray / (N_batch, D_done) ex) (4, 1)
+        """
+        assert len(self.ready) + self.running.sum() >= self.batch_size
+        while len(self.ready) < self.batch_size:
+            for conn in connection.wait(self.conns):
+                result, error = conn.recv()
+                if error is not None:
+                    raise RuntimeError(f"error in env worker process\n{error}")
+                self.ready.append(result)
+
+        results = [self.ready.popleft() for _ in range(self.batch_size)]
+        env_id, rewards, dones, scores = zip(*results)
+        env_id = np.array(env_id)
+        reward, done = np.concatenate(rewards), np.concatenate(dones)
+        self.running[env_id] = False
+        self.update_score(np.array(scores), done, env_id)
+        next_state, self.state = self.read_states(env_id, done)
+
+        return env_id, next_state, reward, done
+
+    def reset(self):
+        # results in flight are discarded.
+        while self.running.any():
+            for conn in connection.wait(self.conns):
+                self.ready.append(conn.recv()[0])
+                self.running[self.ready[-1][0]] = False
+        self.ready.clear()
+        return super(AsyncEnvPool, self).reset()
+
+
+def env_worker(Env, env_config, ids, offset, conn):
+    # step sub-envs of rows from offset, and write their states into shared memory.
+    def write(views, row, state):
+        for view, component in zip(
+            views, state if isinstance(state, list) else [state]
+        ):
+            view[row] = component[0]
+
+    envs, segments = [], []
+    try:
+        for id in ids:
+            envs.append(Env(**env_config) if id is None else Env(id=id, **env_config))
+        attrs = {
+            key: val
+            for key, val in vars(envs[0]).items()
+            if isinstance(val, (int, float, str, bool, list, tuple, type(None)))
+        }
+        conn.send(((attrs, envs[0].reset()), None))
+
+        while True:
+            command, data = conn.recv()
+            result = None
+            if command == "attach":
+                views = []
+                for layout in data:
+                    views.append([])
+                    for name, shape, dtype in layout:
+                        segment = shared_memory.SharedMemory(name=name)
+                        segments.append(segment)
+                        views[-1].append(np.ndarray(shape, dtype, segment.buf))
+                next_views, reset_views = views
+            elif command == "reset":
+                for i, env in enumerate(envs):
+                    write(next_views, offset + i, env.reset())
+            elif command == "step":
+                rewards, dones, scores = [], [], []
+                for i, env in enumerate(envs):
+                    next_state, reward, done = env.step(data[i : i + 1])
+                    write(next_views, offset + i, next_state)
+                    scores.append(env.score)
+                    if np.any(done):
+                        write(reset_views, offset + i, env.reset())
+                    rewards.append(reward)
+                    dones.append(done)
+                result = (np.concatenate(rewards), np.concatenate(dones), scores)
+            elif command == "step_envs":
+                # result of each env is sent as soon as it is ready.
+                for i, action in data:
+                    next_state, reward, done = envs[i].step(action)
+                    write(next_views, offset + i, next_state)
+                    score = envs[i].score
+                    if np.any(done):
+                        write(reset_views, offset + i, envs[i].reset())
+                    conn.send(((offset + i, reward, done, score), None))
+                continue
+            elif command == "close":
+                break
+            conn.send((result, None))
+    except Exception:
+        conn.send((None, traceback.format_exc()))
+    finally:
+        views = next_views = reset_views = None
+        for segment in segments:
+            segment.close()
+        for env in envs:
+            env.close()
+        conn.close()
@@ -3,9 +3,13 @@ from functools import reduce
 
 import ray
 
+from core.env import VecEnv
+
 
 class DistributedManager:
-    def __init__(self, Env, env_config, Agent, agent_config, num_workers, mode):
+    def __init__(
+        self, Env, env_config, Agent, agent_config, num_workers, mode, num_envs=1
+    ):
         assert ray.is_initialized() == False
         try:
             ray.init(address="auto")
@@ -15,7 +19,8 @@ class DistributedManager:
         self.num_workers = num_workers if num_workers else os.cpu_count()
         Env, env_config, agent = map(ray.put, [Env, dict(env_config), agent])
         self.actors = [
-            Actor.remote(Env, env_config, agent, i) for i in range(self.num_workers)
+            Actor.remote(Env, env_config, agent, i, num_envs)
+            for i in range(self.num_workers)
         ]
 
         assert mode in ["sync", "async"]
@@ -67,10 +72,12 @@ class DistributedManager:
 
 @ray.remote
 class Actor:
-    def __init__(self, Env, env_config, agent, id):
+    def __init__(self, Env, env_config, agent, id, num_envs=1):
         self.id = id
-        self.env = Env(id=id + 1, **env_config)
+        num_envs = num_envs if num_envs else 1
+        self.env = VecEnv(Env, env_config, num_envs, id=id * num_envs + 1)
         self.agent = agent.set_distributed(id)
+        assert num_envs == 1 or self.agent.vectorizable
         self.state = self.env.reset()
 
     def run(self, step):
@@ -87,8 +94,8 @@ class Actor:
             transition.update(action_dict)
             transition = self.agent.interact_callback(transition)
             if transition:
-                transitions.append(transition)
-            self.state = next_state if not done else self.env.reset()
+                transitions += self.env.unstack(transition)
+            self.state = self.env.state  # finished envs are reset in step
         return self.id, transitions
 
     def sync(self, sync_item):
@@ -1,6 +1,9 @@
 import traceback
 import time
 from threading import Thread
+import numpy as np
+
+from core.buffer import SharedReplayBuffer
 
 
 # Interact (for async distributed train)
@@ -11,14 +14,22 @@ def interact_process(
     sync_queue,
     run_step,
     update_period,
+    buffer_queue=None,
 ):
     distributed_manager = DistributedManager(*distributed_manager_config)
     distributed_manager.sync(sync_queue.get(), init=True)
+    # write transitions into shared replay buffer, and send only its handle.
+    shared_buffer = (
+        SharedReplayBuffer(*buffer_queue.get()) if buffer_queue is not None else None
+    )
     step = 0
     try:
         while step < run_step:
             transitions, completed_ratio = distributed_manager.run(update_period)
             step += update_period * completed_ratio
+            if shared_buffer is not None:
+                shared_buffer.store(transitions)
+                transitions = [shared_buffer.handle()]
             trans_queue.put((step, transitions))
             if sync_queue.full():
                 distributed_manager.sync(sync_queue.get())
@@ -28,6 +39,60 @@ def interact_process(
         traceback.print_exc()
     finally:
         distributed_manager.terminate()
+        if shared_buffer is not None:
+            shared_buffer.close()
+
+
+# Interact with vectorized env (for single train)
+def vec_interact(env, agent, training):
+    # yield transitions of each step of all envs.
+    state = env.reset()
+    while True:
+        action_dict = agent.act(state, training)
+        next_state, reward, done = env.step(action_dict["action"])
+        transition = {
+            "state": state,
+            "next_state": next_state,
+            "reward": reward,
+            "done": done,
+        }
+        transition.update(action_dict)
+        transition = agent.interact_callback(transition)
+        yield env.unstack(transition) if transition else []
+        state = env.state  # finished envs are reset in step
+
+
+def pool_interact(env, agent, training):
+    # yield transitions of envs ready first, interaction of each env is kept by switch_env.
+    env_id, state = np.arange(env.num_envs), env.reset()
+    pending = dict()  # env id -> (state, action_dict) of running step
+    while True:
+        states = env.unstack({"state": state})
+        if agent.vectorizable:
+            action_dicts = env.unstack(agent.act(state, training))
+        else:
+            action_dicts = []
+            for i, _state in zip(env_id, states):
+                agent.switch_env(i)
+                action_dicts.append(agent.act(_state["state"], training))
+        for i, _state, action_dict in zip(env_id, states, action_dicts):
+            pending[i] = (_state, action_dict)
+        env.send(np.concatenate([a["action"] for a in action_dicts]), env_id)
+
+        env_id, next_state, reward, done = env.recv()
+        results = env.unstack(
+            {"next_state": next_state, "reward": reward, "done": done}
+        )
+        transitions = []
+        for i, result in zip(env_id, results):
+            _state, action_dict = pending.pop(i)
+            transition = {**_state, **result, **action_dict}
+            agent.switch_env(i)
+            transition = agent.interact_callback(transition)
+            if transition:
+                transitions.append(transition)
+        yield transitions
+        state = env.state  # finished envs are reset in their workers
 
 
 # Manage
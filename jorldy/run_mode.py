@@ -1,8 +1,10 @@
 import multiprocessing as mp
+from multiprocessing import resource_tracker
 from threading import Thread
 import time
 
 from core import *
+from core.buffer import ReplayBuffer, SharedReplayBuffer, PrefetchBuffer, RolloutBuffer
 from manager import *
 from process import *
 
@@ -11,7 +13,20 @@ def single_train(config_path, unknown):
     config_manager = ConfigManager(config_path, unknown)
     config = config_manager.config
 
-    env = Env(**config.env)
+    if config.train.env_batch_size:
+        env = AsyncEnvPool(
+            Env,
+            config.env,
+            config.train.num_envs,
+            config.train.env_batch_size,
+            config.train.num_env_processes,
+        )
+    elif config.train.num_env_processes:
+        env = SubprocVecEnv(
+            Env, config.env, config.train.num_envs, config.train.num_env_processes
+        )
+    else:
+        env = VecEnv(Env, config.env, config.train.num_envs)
     agent_config = {
         "state_size": env.state_size,
         "action_size": env.action_size,
@@ -60,24 +75,27 @@ def single_train(config_path, unknown):
     try:
         agent = Agent(**agent_config)
         assert agent.action_type == env.action_type
+        if isinstance(env, AsyncEnvPool):
+            assert (
+                agent.vectorizable or agent.env_state_keys
+            ), f"{config.agent.name} does not support env_batch_size."
+            assert not isinstance(
+                agent.memory, RolloutBuffer
+            ), "rollout of on-policy agent needs lock-step envs, unset env_batch_size."
+            interact = pool_interact(env, agent, config.train.training)
+        else:
+            assert (
+                env.num_envs == 1 or agent.vectorizable
+            ), f"{config.agent.name} does not support num_envs > 1."
+            interact = vec_interact(env, agent, config.train.training)
         if config.train.load_path:
             agent.load(config.train.load_path)
 
         save_path = path_queue.get()
-        state = env.reset()
         for step in range(1, config.train.run_step + 1):
-            action_dict = agent.act(state, config.train.training)
-            next_state, reward, done = env.step(action_dict["action"])
-            transition = {
-                "state": state,
-                "next_state": next_state,
-                "reward": reward,
-                "done": done,
-            }
-            transition.update(action_dict)
-            transition = agent.interact_callback(transition)
-            if transition:
-                result = agent.process([transition], step)
+            transitions = next(interact)
+            if transitions:
+                result = agent.process(transitions, step)
                 result_queue.put((step, result))
             if step % config.train.print_period == 0 or step == config.train.run_step:
                 try:
@@ -87,8 +105,6 @@ def single_train(config_path, unknown):
                 manage_sync_queue.put(agent.sync_out())
             if step % config.train.save_period == 0 or step == config.train.run_step:
                 agent.save(save_path)
-
-            state = next_state if not done else env.reset()
     except Exception as e:
         traceback.print_exc()
         manage.terminate()
@@ -167,6 +183,7 @@ def sync_distributed_train(config_path, unknown):
             {"device": "cpu", **agent_config},
             config.train.num_workers,
             "sync",
+            config.train.num_envs,
         )
 
         agent = Agent(**agent_config)
@@ -232,6 +249,10 @@ def async_distributed_train(config_path, unknown):
     result_queue = mp.Queue()
     manage_sync_queue = mp.Queue(1)
     path_queue = mp.Queue(1)
+    buffer_queue = mp.Queue(1) if config.train.shared_buffer else None
+    if buffer_queue is not None:
+        # all processes share one resource tracker, so shared memory is unlinked once.
+        resource_tracker.ensure_running()
 
     record_period = (
         config.train.record_period
@@ -272,6 +293,7 @@ def async_distributed_train(config_path, unknown):
         {"device": "cpu", **agent_config},
         config.train.num_workers,
         "async",
+        config.train.num_envs,
     )
     interact = mp.Process(
         target=interact_process,
@@ -282,6 +304,7 @@ def async_distributed_train(config_path, unknown):
             interact_sync_queue,
             config.train.run_step,
             config.train.update_period,
+            buffer_queue,
         ),
     )
     manage.start()
@@ -291,6 +314,21 @@ def async_distributed_train(config_path, unknown):
         assert agent.action_type == env.action_type
         if config.train.load_path:
             agent.load(config.train.load_path)
+        if buffer_queue is not None:
+            # transitions are written into shared memory by interact process.
+            memory = (
+                agent.memory.memory
+                if isinstance(agent.memory, PrefetchBuffer)
+                else agent.memory
+            )
+            assert (
+                type(memory) is ReplayBuffer
+            ), "shared_buffer is only supported for agents using ReplayBuffer."
+            buffer_config = (memory.buffer_size, memory.stack_frame)
+            agent.memory = agent.prefetch(
+                SharedReplayBuffer(*buffer_config), agent.prefetch_batch
+            )
+            buffer_queue.put(buffer_config)
         interact_sync_queue.put(agent.sync_out())
 
         save_path = path_queue.get()
@@ -355,6 +393,9 @@ def async_distributed_train(config_path, unknown):
         manage.join()
         print("Manage process done.")
     finally:
+        if buffer_queue is not None:
+            agent.memory.close(unlink=True)
+            buffer_queue.close()
         trans_queue.close()
         gath_thread.join()
         interact_sync_queue.close()
@@ -41,3 +41,31 @@ def test_dqn(MockEnv):
 
     # test sync in and out
     check_sync_in_out(agent)
+
+
+def test_dqn_prefetch(MockEnv):
+    state_size, action_size, action_type = 2, 3, "discrete"
+    episode_len = 10
+    env = MockEnv(state_size, action_size, action_type, episode_len)
+
+    buffer_size, batch_size, start_train_step = 100, 4, 8
+    run_step = 20
+    agent = DQN(
+        state_size=state_size,
+        action_size=action_size,
+        hidden_size=4,
+        buffer_size=buffer_size,
+        batch_size=batch_size,
+        start_train_step=start_train_step,
+        run_step=run_step,
+        prefetch_batch=2,
+    )
+
+    # test inteact with batches prepared in background
+    check_interact(env, agent, run_step)
+    assert agent.num_learn == (run_step - start_train_step + 1)
+    assert agent.memory.size == run_step
+
+    # test save and load
+    check_save_load(agent, "./tmp_test_dqn_prefetch")
+    agent.memory.stop()
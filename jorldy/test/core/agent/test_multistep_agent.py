@@ -1,3 +1,5 @@
+import numpy as np
+
 from core.agent.multistep import Multistep
 from .utils import check_interact, check_save_load, check_sync_in_out
 
@@ -44,3 +46,33 @@ def test_multistep(MockEnv):
 
     # test sync in and out
     check_sync_in_out(agent)
+
+
+def test_multistep_switch_env():
+    n_step = 3
+    agent = Multistep(state_size=2, action_size=3, hidden_size=4, n_step=n_step)
+
+    # test transitions of two envs arriving in turn are kept in separate streams
+    transitions = {0: [], 1: []}
+    for t in range(2 * n_step):
+        for env_id in (0, 1):
+            agent.switch_env(env_id)
+            transition = agent.interact_callback(
+                {
+                    "state": np.full((1, 2), t),
+                    "action": np.array([[env_id]]),
+                    "reward": np.array([[t]]),
+                    "next_state": np.full((1, 2), t + 1),
+                    "done": np.array([[False]]),
+                }
+            )
+            if transition:
+                transitions[env_id].append(transition)
+
+    for env_id in (0, 1):
+        assert len(transitions[env_id]) == n_step + 1
+        for t, transition in enumerate(transitions[env_id]):
+            assert (transition["action"] == env_id).all()
+            assert (transition["state"] == t).all()
+            assert (transition["next_state"] == t + n_step).all()
+            assert (transition["reward"][0, :, 0] == np.arange(t, t + n_step)).all()
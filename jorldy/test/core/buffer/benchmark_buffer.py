@@ -0,0 +1,301 @@
+"""Microbenchmark of buffers in core/buffer.
+
+Throughput of store, sample and update_priorities is measured for ReplayBuffer,
+PERBuffer, RolloutBuffer and MuzeroPERBuffer with vector, atari frame and multimodal
+(DroneDeliveryMLAgent-style) transitions, and the results are written as json.
+
+Usage (in jorldy directory):
+    python test/core/buffer/benchmark_buffer.py --output buffer_benchmark.json
+    python test/core/buffer/benchmark_buffer.py --quick --buffers PERBuffer
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+
+sys.path.append(os.getcwd())  # benchmark should be run on JORLDY/jorldy
+from core.buffer import ReplayBuffer, PERBuffer, RolloutBuffer, MuzeroPERBuffer
+
+default_capacities = [10000, 100000]
+default_batch_sizes = [32, 256]
+quick_capacities = [1000]
+quick_batch_sizes = [32]
+
+store_size = 16  # the number of transitions stored at once (e.g. one actor step)
+trajectory_size = 200  # the number of positions of one trajectory of MuzeroPERBuffer
+
+
+class TransitionMaker:
+    """Make a stream of transitions of one kind.
+
+    Args:
+        kind (str): kind of transition. ("vector", "atari" or "multimodal")
+        stack_frame (int): the number of stacked frames in atari state.
+    """
+
+    def __init__(self, kind, stack_frame=4):
+        self.kind = kind
+        self.stack_frame = stack_frame
+        self.state = self.make_state()
+
+    def make_state(self):
+        if self.kind == "vector":
+            return np.random.random((1, 4)).astype(np.float32)
+        elif self.kind == "atari":
+            return np.random.randint(
+                256, size=(1, self.stack_frame, 84, 84), dtype=np.uint8
+            )
+        elif self.kind == "multimodal":
+            return [
+                np.random.randint(256, size=(1, 15, 36, 64), dtype=np.uint8),
+                np.random.random((1, 95)).astype(np.float32),
+            ]
+        raise ValueError(f"unknown kind of transition: {self.kind}")
+
+    def next_state(self):
+        if self.kind == "atari":
+            # consecutive states share frames as in FrameStack of atari env.
+            frame = np.random.randint(256, size=(1, 1, 84, 84), dtype=np.uint8)
+            return np.concatenate((self.state[:, 1:], frame), axis=1)
+        return self.make_state()
+
+    def make(self, num):
+        transitions = []
+        for _ in range(num):
+            next_state = self.next_state()
+            action_size = 3 if self.kind == "multimodal" else 1
+            transitions.append(
+                {
+                    "state": self.state,
+                    "action": np.random.random((1, action_size)).astype(np.float32),
+                    "reward": np.random.random((1, 1)).astype(np.float32),
+                    "next_state": next_state,
+                    "done": np.random.random((1, 1)) < 0.01,
+                }
+            )
+            self.state = next_state
+        return transitions
+
+
+def make_trajectory(kind, length, num_stack, num_td_step, action_size=3):
+    # trajectory as made in Muzero.interact_callback
+    if kind == "vector":
+        make_state = lambda: np.random.random((1, 4)).astype(np.float32)
+    elif kind == "atari":
+        make_state = lambda: np.random.randint(256, size=(1, 1, 96, 96), dtype=np.uint8)
+    else:
+        raise ValueError(f"unsupported kind of trajectory: {kind}")
+
+    size = num_stack + length
+    return {
+        "trajectory": {
+            "states": [make_state() for _ in range(size + 1)],
+            "actions": [
+                np.random.randint(action_size, size=(1, 1)) for _ in range(size)
+            ],
+            "rewards": [np.random.random((1, 1)) for _ in range(size)],
+            "values": [np.array(np.random.random()) for _ in range(size)],
+            "policies": [
+                np.random.dirichlet(np.ones(action_size)) for _ in range(size)
+            ],
+        },
+        "priorities": np.random.random(length),
+        "start": num_stack,
+    }
+
+
+def measure(func, num_items, repeat, setup=None):
+    """
+    Call func repeatedly and return throughput. Only func is timed, not setup.
+
+    Args:
+        func (function): function to measure.
+        num_items (int): the number of items processed by one call of func.
+        repeat (int): the number of timed calls.
+        setup (function): function called before each call of func.
+    """
+    if setup is not None:
+        setup()
+    func()  # warm up
+    elapsed = 0.0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed += time.perf_counter() - start
+    return {
+        "items_per_sec": num_items * repeat / elapsed,
+        "sec_per_call": elapsed / repeat,
+    }
+
+
+def fill(memory, maker, capacity):
+    stored = 0
+    while stored < capacity:
+        memory.store(maker.make(store_size))
+        stored += store_size
+
+
+def bench_replay_buffer(kind, capacity, batch_sizes, repeat, per=False):
+    stack_frame = 4 if kind == "atari" else None
+    if per:
+        memory = PERBuffer(capacity, stack_frame=stack_frame)
+    else:
+        memory = ReplayBuffer(capacity, stack_frame=stack_frame)
+    memory.first_store = False  # skip dimension check print
+    maker = TransitionMaker(kind)
+    fill(memory, maker, capacity)
+
+    transitions = maker.make(store_size)
+    results = {"store": measure(lambda: memory.store(transitions), store_size, repeat)}
+    for batch_size in batch_sizes:
+        if per:
+            sample = lambda: memory.sample(0.4, batch_size)
+        else:
+            sample = lambda: memory.sample(batch_size)
+        results[f"sample_{batch_size}"] = measure(sample, batch_size, repeat)
+
+        if per:
+            _, _, indices, _, _ = memory.sample(0.4, batch_size)
+            priorities = np.random.random(batch_size)
+            update = lambda: memory.update_priorities(indices, priorities)
+            results[f"update_priorities_{batch_size}"] = measure(
+                update, batch_size, repeat
+            )
+    return results
+
+
+def bench_rollout_buffer(kind, capacity, batch_sizes, repeat, num_workers=8):
+    # a rollout of capacity transitions is stored by workers, then sampled at once.
+    n_step = max(capacity // num_workers, 1)
+    memory = RolloutBuffer(n_step, num_workers)
+    memory.first_store = False
+    maker = TransitionMaker(kind)
+    steps = []
+    for worker in range(num_workers):
+        for transition in maker.make(n_step):
+            transition["worker"] = np.array([[worker]])
+            steps.append(transition)
+    chunks = [steps[i : i + store_size] for i in range(0, len(steps), store_size)]
+
+    def store():
+        for chunk in chunks:
+            memory.store(chunk)
+
+    return {
+        "store": measure(store, len(steps), repeat, setup=memory.sample),
+        "sample": measure(memory.sample, len(steps), repeat, setup=store),
+    }
+
+
+def bench_muzero_per_buffer(kind, capacity, batch_sizes, repeat):
+    num_stack, num_unroll, num_td_step = (4, 5, 10) if kind == "atari" else (1, 5, 5)
+    memory = MuzeroPERBuffer(
+        capacity, num_stack=num_stack, num_unroll=num_unroll, num_td_step=num_td_step
+    )
+    memory.first_store = False
+    length = min(trajectory_size, capacity // 4)
+    trajectories = [
+        make_trajectory(kind, length, num_stack, num_td_step) for _ in range(4)
+    ]
+    for _ in range(capacity // length):
+        memory.store(trajectories)
+
+    store = lambda: memory.store(trajectories)
+    results = {"store": measure(store, len(trajectories) * length, repeat)}
+    for batch_size in batch_sizes:
+        sample = lambda: memory.sample(0.4, batch_size)
+        results[f"sample_{batch_size}"] = measure(sample, batch_size, repeat)
+
+        _, _, indices, _, _ = memory.sample(0.4, batch_size)
+        priorities = np.random.random(batch_size)
+        update = lambda: memory.update_priorities(indices, priorities)
+        results[f"update_priorities_{batch_size}"] = measure(update, batch_size, repeat)
+    return results
+
+
+# name of buffer -> (benchmark function, supported kinds of transition)
+benchmarks = {
+    "ReplayBuffer": (bench_replay_buffer, ["vector", "atari", "multimodal"]),
+    "PERBuffer": (
+        partial(bench_replay_buffer, per=True),
+        ["vector", "atari", "multimodal"],
+    ),
+    "RolloutBuffer": (bench_rollout_buffer, ["vector", "atari", "multimodal"]),
+    "MuzeroPERBuffer": (bench_muzero_per_buffer, ["vector", "atari"]),
+}
+
+
+def run(capacities, batch_sizes, repeat, buffers=None, kinds=None, verbose=True):
+    results = []
+    for name, (bench, supported_kinds) in benchmarks.items():
+        if buffers and name not in buffers:
+            continue
+        for kind in supported_kinds:
+            if kinds and kind not in kinds:
+                continue
+            for capacity in capacities:
+                ops = bench(kind, capacity, batch_sizes, repeat)
+                for op, result in ops.items():
+                    results.append(
+                        {
+                            "buffer": name,
+                            "transition": kind,
+                            "capacity": capacity,
+                            "op": op,
+                            **result,
+                        }
+                    )
+                    if verbose:
+                        print(
+                            f"{name:16s} {kind:10s} {capacity:>8d} {op:24s} "
+                            f"{result['items_per_sec']:>14.1f} items/s"
+                        )
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "config": {
+            "capacities": capacities,
+            "batch_sizes": batch_sizes,
+            "repeat": repeat,
+            "store_size": store_size,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=str, default="buffer_benchmark.json")
+    parser.add_argument("--capacities", type=int, nargs="+")
+    parser.add_argument("--batch-sizes", type=int, nargs="+")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--buffers", type=str, nargs="+", choices=list(benchmarks))
+    parser.add_argument("--kinds", type=str, nargs="+")
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+
+    capacities = args.capacities or (
+        quick_capacities if args.quick else default_capacities
+    )
+    batch_sizes = args.batch_sizes or (
+        quick_batch_sizes if args.quick else default_batch_sizes
+    )
+    report = run(capacities, batch_sizes, args.repeat, args.buffers, args.kinds)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"... Benchmark results are saved in {args.output} ...")
@@ -0,0 +1,19 @@
+import json
+
+from .benchmark_buffer import run, benchmarks
+
+
+def test_benchmark_buffer(tmp_path):
+    report = run(capacities=[64], batch_sizes=[8], repeat=1, verbose=False)
+
+    # test every supported pair of buffer and transition is measured
+    measured = {(r["buffer"], r["transition"]) for r in report["results"]}
+    assert measured == {
+        (name, kind) for name, (_, kinds) in benchmarks.items() for kind in kinds
+    }
+    assert all(r["items_per_sec"] > 0 for r in report["results"])
+
+    # test report is json serializable
+    path = tmp_path / "buffer_benchmark.json"
+    path.write_text(json.dumps(report))
+    assert json.loads(path.read_text())["config"]["capacities"] == [64]
@@ -0,0 +1,106 @@
+import numpy as np
+
+from core.agent.muzero import Muzero
+from core.buffer.muzero_per_buffer import MuzeroPERBuffer
+
+
+def make_trajectory(length, start, num_td_step, done, action_size):
+    # trajectory as made in Muzero.interact_callback
+    size = length + start + (0 if done else num_td_step)
+    states = [np.random.random((1, 2)) for _ in range(size + 1)]
+    actions = [np.random.randint(action_size, size=(1, 1)) for _ in range(size)]
+    rewards = [np.random.random((1, 1)) for _ in range(size)]
+    values = [np.array(np.random.random()) for _ in range(size)]
+    policies = [np.random.dirichlet(np.ones(action_size)) for _ in range(size)]
+    if not done:
+        states, actions = states[: -num_td_step - 1], actions[: -num_td_step - 1]
+        policies = policies[:-num_td_step]
+    trajectory = {
+        "states": states,
+        "actions": actions,
+        "rewards": rewards,
+        "values": values,
+        "policies": policies,
+    }
+    return {
+        "trajectory": trajectory,
+        "priorities": np.random.random(length),
+        "start": start,
+    }
+
+
+def test_muzero_per_buffer():
+    buffer_size, action_size = 64, 3
+    num_stack, num_unroll, num_td_step, gamma = 4, 3, 2, 0.9
+    agent = Muzero(
+        state_size=2,
+        action_size=action_size,
+        hidden_size=4,
+        num_stack=num_stack,
+        num_unroll=num_unroll,
+        num_td_step=num_td_step,
+        num_rb=1,
+        gamma=gamma,
+        use_prev_rand_action=False,
+        use_over_rand_action=False,
+        use_uniform_policy=False,
+        device="cpu",
+    )
+    memory = MuzeroPERBuffer(
+        buffer_size, 1e-3, num_stack, num_unroll, num_td_step, gamma
+    )
+
+    # test store with removal of the oldest trajectories
+    stored = []
+    for i in range(30):
+        transition = make_trajectory(
+            np.random.randint(1, 12),
+            num_stack * (i % 2),
+            num_td_step,
+            i % 3 == 0,
+            action_size,
+        )
+        memory.store([transition])
+        stored.append(transition)
+
+    live = stored[memory.traj_offset : memory.traj_index]
+    assert memory.size == sum(len(t["priorities"]) for t in live) <= buffer_size
+    assert np.isclose(memory.sum_tree[0], sum(t["priorities"].sum() for t in live))
+
+    # test windows are same as the ones made from trajectory
+    leaves = (
+        memory.tree_start - memory.first_leaf_index + np.arange(memory.size)
+    ) % buffer_size
+    windows = memory.read(leaves)
+    assert (windows["action_pad"] > 0).any() and windows["policy_pad"].any()
+    for b, leaf in enumerate(leaves):
+        transition = stored[memory.leaf_traj[leaf]]
+        trajectory, start = transition["trajectory"], memory.leaf_pos[leaf]
+        assert (
+            transition["priorities"][start - transition["start"]]
+            == memory.sum_tree[leaf + memory.first_leaf_index]
+        )
+
+        end = start + num_unroll + 1
+        state, action = agent.get_stacked_data(
+            trajectory, end - 1, num_stack + num_unroll
+        )
+        policy = trajectory["policies"][start:end]
+        policy += [np.zeros(action_size)] * (num_unroll - len(policy) + 1)
+        reward = trajectory["rewards"][start : end - 1]
+        reward += [np.zeros((1, 1))] * (num_unroll - len(reward) + 1)
+        value = [agent.get_bootstrap_value(trajectory, i) for i in range(start, end)]
+
+        assert np.allclose(windows["state"][b], state)
+        assert (windows["action"][b] == action).all()
+        assert np.allclose(windows["policy"][b], np.stack(policy))
+        assert np.allclose(windows["reward"][b], np.stack(reward).squeeze(-1))
+        assert np.allclose(windows["value"][b], np.stack(value).squeeze(-1))
+
+    # test sample and priority update
+    batch_size = 8
+    transitions, weights, indices, sampled_p, mean_p = memory.sample(0.4, batch_size)
+    assert transitions["state"].shape == (batch_size, (num_stack + num_unroll + 1) * 2)
+    assert transitions["reward"].shape == (batch_size, num_unroll + 1, 1)
+    memory.update_priorities(indices, np.full(batch_size, 5.0))
+    assert (memory.sum_tree[indices] == 5.0).all()
@@ -54,3 +54,104 @@ def test_per_buffer(mock_transition):
 
     assert memory.max_priority == new_priority
     assert memory.sum_tree[buffer_size - 1 + (buffer_size // 2)] == new_priority
+
+
+def test_per_buffer_batch_priorities(mock_transition):
+    buffer_size = 11
+    memory = PERBuffer(buffer_size=buffer_size)
+    memory.store(mock_transition * buffer_size)
+
+    # test update_priorities with duplicated indices
+    indices = np.array([0, 3, 3, 7, 10]) + memory.first_leaf_index
+    new_priorities = np.array([0.5, 2.0, 3.0, 0.25, 4.0])
+    memory.update_priorities(indices, new_priorities)
+
+    leaves = memory.sum_tree[memory.first_leaf_index :]
+    assert leaves[3] == 3.0
+    assert memory.max_priority == 4.0
+    assert np.isclose(memory.sum_tree[0], leaves.sum())
+    for index in range(memory.first_leaf_index):
+        left, right = (index * 2) + 1, (index * 2) + 2
+        assert np.isclose(
+            memory.sum_tree[index], memory.sum_tree[left] + memory.sum_tree[right]
+        )
+
+    # test search_tree finds leaves of all targets at once
+    targets = np.random.uniform(size=64) * memory.sum_tree[0]
+    found = memory.search_tree(targets)
+    assert (found >= memory.first_leaf_index).all()
+    assert (memory.sum_tree[found] > 0.0).all()
+
+    # leaf nodes are on the same level if buffer size is power of 2
+    memory = PERBuffer(buffer_size=8)
+    memory.store(mock_transition * 8)
+    memory.update_priorities(np.arange(8) + memory.first_leaf_index, np.arange(8))
+
+    cumsum = np.cumsum(memory.sum_tree[memory.first_leaf_index :])
+    targets = np.random.uniform(size=64) * memory.sum_tree[0]
+    found = memory.search_tree(targets)
+    expected = np.searchsorted(cumsum, targets) + memory.first_leaf_index
+    assert (found == expected).all()
+
+
+def test_per_buffer_memmap(mock_transition, tmp_path):
+    buffer_size, buffer_path = 10, str(tmp_path / "buffer")
+    memory = PERBuffer(buffer_size=buffer_size, buffer_path=buffer_path)
+
+    # test store into memory-mapped files
+    for _ in range(15):
+        memory.store(mock_transition)
+    memory.update_priority(2.0, memory.first_leaf_index + 3)
+    assert isinstance(memory.buffer["state"], np.memmap)
+    assert isinstance(memory.buffer["multi_modal"][0], np.memmap)
+    memory.flush()
+
+    # test reopen buffer to warm start
+    reopened = PERBuffer(buffer_size=buffer_size, buffer_path=buffer_path)
+    assert reopened.size == memory.size
+    assert reopened.buffer_index == memory.buffer_index
+    assert reopened.tree_index == memory.tree_index
+    assert reopened.max_priority == memory.max_priority
+    assert (reopened.sum_tree == memory.sum_tree).all()
+    assert (reopened.buffer["state"] == memory.buffer["state"]).all()
+    assert (reopened.buffer["multi_modal"][1] == memory.buffer["multi_modal"][1]).all()
+
+    sample_transitions, weights, indices, sampled_p, mean_p = reopened.sample(
+        beta=0.4, batch_size=8
+    )
+    assert sample_transitions["state"].shape == (
+        8,
+        *mock_transition[0]["state"].shape[1:],
+    )
+
+
+def test_per_buffer_snapshot(mock_transition, tmp_path):
+    buffer_size, path = 10, str(tmp_path / "snapshot")
+    memory = PERBuffer(buffer_size=buffer_size)
+    for _ in range(7):
+        memory.store(mock_transition)
+    memory.update_priority(3.0, memory.first_leaf_index + 2)
+
+    for compress in [False, True]:
+        # test save in background and load
+        memory.save(path, compress)
+        memory.wait_save()
+        assert memory.save_thread is None
+
+        loaded = PERBuffer(buffer_size=buffer_size)
+        loaded.load(path)
+        assert loaded.size == memory.size
+        assert loaded.buffer_index == memory.buffer_index
+        assert loaded.max_priority == memory.max_priority
+        assert (loaded.sum_tree == memory.sum_tree).all()
+        for key in ["state", "seq"]:
+            assert loaded.buffer[key].shape == memory.buffer[key].shape
+            assert (loaded.buffer[key] == memory.buffer[key]).all()
+        assert (
+            loaded.buffer["multi_modal"][0] == memory.buffer["multi_modal"][0]
+        ).all()
+
+        # test loaded buffer is writable
+        for _ in range(5):
+            loaded.store(mock_transition)
+        assert loaded.size == buffer_size
@@ -0,0 +1,65 @@
+import numpy as np
+
+from core.buffer.replay_buffer import ReplayBuffer
+from core.buffer.per_buffer import PERBuffer
+from core.buffer.prefetch_buffer import PrefetchBuffer
+
+
+def test_prefetch_buffer(mock_transition):
+    buffer_size, num_prefetch = 10, 2
+    transformed = []
+
+    def transform(transitions):
+        transformed.append(len(transformed))
+        transitions["transformed"] = True
+
+    memory = PrefetchBuffer(ReplayBuffer(buffer_size), num_prefetch, transform)
+
+    # test store and attributes of wrapped buffer
+    for _ in range(15):
+        memory.store(mock_transition)
+    assert memory.size == buffer_size
+    assert memory.buffer_index == 15 % buffer_size
+
+    # test sample returns transformed batches prepared in background
+    batch_size = 8
+    for _ in range(5):
+        sample_transitions = memory.sample(batch_size)
+        assert sample_transitions["transformed"]
+        assert sample_transitions["state"].shape[0] == batch_size
+    assert len(transformed) >= 5
+
+    memory.stop()
+    assert memory.prefetch_thread is None
+    assert memory.batch_queue.empty()
+
+
+def test_prefetch_buffer_priorities(mock_transition):
+    buffer_size, batch_size, beta = 8, 4, 0.4
+    memory = PrefetchBuffer(PERBuffer(buffer_size), num_prefetch=1)
+    for _ in range(buffer_size):
+        memory.store(mock_transition)
+
+    # test priority update between samples
+    transitions, weights, indices, sampled_p, mean_p = memory.sample(beta, batch_size)
+    assert weights.shape == indices.shape == (batch_size,)
+    memory.update_priorities(indices, np.full(batch_size, 2.0))
+    assert (memory.sum_tree[indices] == 2.0).all()
+    assert np.isclose(
+        memory.sum_tree[0], memory.sum_tree[memory.first_leaf_index :].sum()
+    )
+
+    transitions, weights, indices, sampled_p, mean_p = memory.sample(beta, batch_size)
+    assert len(indices) == batch_size
+    memory.stop()
+
+
+def test_prefetch_buffer_error():
+    memory = PrefetchBuffer(PERBuffer(8), num_prefetch=1)
+
+    # test error of sampling in background is raised at sample
+    try:
+        memory.sample(0.4, 4)
+        assert False
+    except AssertionError as e:
+        assert str(e) == ""
@@ -34,3 +34,72 @@ def test_replay_buffer(mock_transition):
         else:
             assert isinstance(val, np.ndarray)
             assert val.shape == (batch_size, *mock_transition[0][key].shape[1:])
+
+
+def test_replay_buffer_columnar_store():
+    buffer_size = 4
+    memory = ReplayBuffer(buffer_size=buffer_size)
+
+    transitions = [
+        {
+            "state": np.full((1, 2, 3), i, dtype=np.uint8),
+            "done": np.array([[i % 2 == 0]]),
+            "multi_modal": [np.full((1, 3), i), np.full((1, 1), i * 0.5)],
+        }
+        for i in range(6)
+    ]
+    memory.store(transitions[:3])
+    memory.store(transitions[3:])
+
+    # test storage keeps dtype and wraps around
+    assert memory.buffer["state"].dtype == np.uint8
+    assert memory.buffer["done"].dtype == bool
+    assert memory.buffer_index == 6 % buffer_size
+    assert memory.size == buffer_size
+    assert list(memory.buffer["state"][:, 0, 0]) == [4, 5, 2, 3]
+    assert list(memory.buffer["multi_modal"][1][:, 0]) == [2.0, 2.5, 1.0, 1.5]
+
+    # test store more transitions than buffer size at once
+    memory.store(transitions)
+    assert memory.buffer_index == 12 % buffer_size
+    assert list(memory.buffer["state"][:, 0, 0]) == [2, 3, 4, 5]
+
+    sample_transitions = memory.read(np.array([0, 3]))
+    assert list(sample_transitions["state"][:, 0, 0]) == [2, 5]
+    assert list(sample_transitions["multi_modal"][0][:, 0]) == [2, 5]
+
+
+def test_replay_buffer_stack_frame():
+    buffer_size, stack_frame = 16, 4
+    memory = ReplayBuffer(buffer_size=buffer_size, stack_frame=stack_frame)
+
+    # stacked-frame states as in Atari env (tile at reset, shift at step)
+    transitions = []
+    frame = np.random.randint(0, 255, size=(1, 8, 8), dtype=np.uint8)
+    state = np.tile(frame, (stack_frame, 1, 1))[np.newaxis]
+    for t in range(40):
+        frame = np.random.randint(0, 255, size=(1, 8, 8), dtype=np.uint8)
+        next_state = np.concatenate((state[:, 1:], frame[np.newaxis]), axis=1)
+        transitions.append(
+            {
+                "state": state,
+                "action": np.array([[t]]),
+                "next_state": next_state,
+            }
+        )
+        state = next_state
+    for i in range(0, len(transitions), 3):
+        memory.store(transitions[i : i + 3])
+
+    # test each frame is stored once
+    assert memory.buffer["state"].shape == (buffer_size, stack_frame)
+    assert memory.frame_storage.size <= buffer_size + stack_frame
+
+    # test stacked states are rebuilt on sample
+    sample_transitions = memory.read(np.arange(buffer_size))
+    for i, t in enumerate(sample_transitions["action"][:, 0]):
+        assert sample_transitions["state"].dtype == np.uint8
+        assert (sample_transitions["state"][i] == transitions[t]["state"][0]).all()
+        assert (
+            sample_transitions["next_state"][i] == transitions[t]["next_state"][0]
+        ).all()
@@ -7,7 +7,7 @@ def test_rollout_buffer(mock_transition):
     memory = RolloutBuffer()
 
     # test after init
-    assert isinstance(memory.buffer, list)
+    assert isinstance(memory.buffer, dict)
     assert memory.size == 0
 
     # test store
@@ -36,3 +36,38 @@ def test_rollout_buffer(mock_transition):
 
     # test after sample
     assert memory.size == 0
+
+
+def test_rollout_buffer_worker_major():
+    n_step, num_workers = 4, 2
+    memory = RolloutBuffer(n_step=n_step, num_workers=num_workers)
+
+    def make_transitions(worker, steps):
+        return [
+            {
+                "state": np.full((1, 2), 10 * worker + t, dtype=np.float32),
+                "multi_modal": [np.full((1, 3), t), np.full((1, 1), worker)],
+                "worker": np.array([[worker]]),
+            }
+            for t in steps
+        ]
+
+    # test transitions of workers arrive interleaved and in chunks
+    memory.store(make_transitions(1, range(2)) + make_transitions(0, range(3)))
+    memory.store(make_transitions(2, range(4)))
+    memory.store(make_transitions(0, range(3, 6)) + make_transitions(1, range(2, 4)))
+    assert memory.size == 14
+
+    # test completed rows are returned in worker-major order
+    sample_transitions = memory.sample()
+    state = sample_transitions["state"][:, 0].reshape(-1, n_step)
+    assert (state == [[10, 11, 12, 13], [0, 1, 2, 3], [20, 21, 22, 23]]).all()
+    assert sample_transitions["multi_modal"][1].shape == (3 * n_step, 1)
+    assert memory.size == 2
+
+    # test the remaining steps of worker continue in the next sample
+    memory.store(make_transitions(0, range(6, 8)))
+    sample_transitions = memory.sample()
+    assert (sample_transitions["state"][:, 0] == [4, 5, 6, 7]).all()
+    assert np.shares_memory(sample_transitions["state"], memory.buffer["state"])
+    assert memory.size == 0
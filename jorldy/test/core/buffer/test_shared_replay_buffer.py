@@ -0,0 +1,58 @@
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+import numpy as np
+
+from core.buffer.shared_replay_buffer import SharedReplayBuffer
+
+
+def write_process(buffer_size, stack_frame, handle_queue, done_queue):
+    memory = SharedReplayBuffer(buffer_size=buffer_size, stack_frame=stack_frame)
+    frame = np.zeros((1, 8, 8), dtype=np.uint8)
+    state = np.tile(frame, (stack_frame, 1, 1))[np.newaxis]
+    for t in range(3 * buffer_size):
+        frame = np.full((1, 8, 8), t, dtype=np.uint8)
+        next_state = np.concatenate((state[:, 1:], frame[np.newaxis]), axis=1)
+        transition = {
+            "state": state,
+            "action": np.array([[t]]),
+            "next_state": next_state,
+        }
+        memory.store([transition])
+        handle_queue.put([memory.handle()])
+        state = next_state
+    done_queue.get()
+    memory.close()
+
+
+def test_shared_replay_buffer():
+    buffer_size, stack_frame = 8, 4
+    memory = SharedReplayBuffer(buffer_size=buffer_size, stack_frame=stack_frame)
+
+    handle_queue, done_queue = mp.Queue(), mp.Queue()
+    resource_tracker.ensure_running()
+    writer = mp.Process(
+        target=write_process, args=(buffer_size, stack_frame, handle_queue, done_queue)
+    )
+    writer.start()
+
+    # test reader follows handles of writer (frame pool grows on the way)
+    for _ in range(3 * buffer_size):
+        memory.store(handle_queue.get())
+    assert memory.buffer_index == (3 * buffer_size) % buffer_size
+    assert memory.size == buffer_size
+
+    # test reader samples transitions written by writer
+    sample_transitions = memory.read(np.arange(buffer_size))
+    actions = sample_transitions["action"][:, 0]
+    assert sorted(actions) == list(range(2 * buffer_size, 3 * buffer_size))
+    for i, t in enumerate(actions):
+        assert (sample_transitions["next_state"][i, -1] == t).all()
+        assert (sample_transitions["state"][i, -1] == max(t - 1, 0)).all()
+
+    sample_transitions = memory.sample(batch_size=4)
+    assert sample_transitions["state"].shape == (4, stack_frame, 8, 8)
+
+    done_queue.put(True)
+    writer.join()
+    memory.close(unlink=True)
+    assert writer.exitcode == 0
@@ -0,0 +1,106 @@
+import time
+import numpy as np
+
+from core.env import VecEnv, SubprocVecEnv, AsyncEnvPool
+from core.env.gym_env import Cartpole
+
+
+def test_vec_env(MockAgent):
+    num_envs = 3
+    env = VecEnv(Cartpole, {"action_type": "discrete"}, num_envs)
+    agent = MockAgent(env.state_size, env.action_size, env.action_type)
+
+    # test sub-envs are stepped together and finished sub-envs are reset
+    state = env.reset()
+    assert state.shape == (num_envs, env.state_size)
+    num_done = np.zeros(num_envs)
+    for _ in range(100):
+        action_dict = agent.act(state)
+        next_state, reward, done = env.step(action_dict["action"])
+        assert next_state.shape == (num_envs, env.state_size)
+        assert reward.shape == done.shape == (num_envs, 1)
+        assert (env.score[done[:, 0]] == 0).all()
+
+        num_done += done[:, 0]
+        state = env.state
+    assert (num_done > 0).all()
+    assert not np.isnan(env.episode_score).any()
+
+    # test stacked transition is split into transitions of each sub-env
+    transition = {
+        "state": state,
+        "multi_modal": [np.zeros((num_envs, 2)), np.ones((num_envs, 3))],
+    }
+    transitions = env.unstack(transition)
+    assert len(transitions) == num_envs
+    assert transitions[1]["state"].shape == (1, env.state_size)
+    assert (transitions[1]["state"] == state[1]).all()
+    assert transitions[1]["multi_modal"][1].shape == (1, 3)
+
+    env.close()
+
+
+def test_subproc_vec_env(MockAgent):
+    num_envs, num_processes = 5, 2
+    env = SubprocVecEnv(Cartpole, {"action_type": "discrete"}, num_envs, num_processes)
+    agent = MockAgent(env.state_size, env.action_size, env.action_type)
+    assert len(env.processes) == num_processes
+
+    # test states of worker processes are read from shared memory
+    state = env.reset()
+    assert state.shape == (num_envs, env.state_size)
+    num_done = np.zeros(num_envs)
+    for _ in range(100):
+        action_dict = agent.act(state)
+        next_state, reward, done = env.step(action_dict["action"])
+        assert next_state.shape == (num_envs, env.state_size)
+        assert reward.shape == done.shape == (num_envs, 1)
+
+        # finished envs start new episodes, the others continue from next_state
+        running = ~done[:, 0]
+        assert (env.state[running] == next_state[running]).all()
+        num_done += done[:, 0]
+        state = env.state
+    assert (num_done > 0).all()
+    assert not np.isnan(env.episode_score).any()
+
+    env.close()
+    assert all(not process.is_alive() for process in env.processes)
+
+
+class SlowCartpole(Cartpole):
+    def __init__(self, id, **kwargs):
+        super(SlowCartpole, self).__init__(**kwargs)
+        self.delay = 0.5 if id == 0 else 0.0
+
+    def step(self, action):
+        time.sleep(self.delay)
+        return super(SlowCartpole, self).step(action)
+
+
+def test_async_env_pool():
+    num_envs, batch_size = 4, 2
+    env = AsyncEnvPool(SlowCartpole, {}, num_envs, batch_size, num_processes=4, id=0)
+    assert env.state_size == 4
+
+    # test results of envs ready first are returned (env 0 is slow)
+    state = env.reset()
+    env.send(np.zeros((num_envs, 1), dtype=int), np.arange(num_envs))
+    for _ in range(5):
+        env_id, next_state, reward, done = env.recv()
+        assert 0 not in env_id
+        assert len(set(env_id)) == batch_size
+        assert next_state.shape == (batch_size, env.state_size)
+        assert reward.shape == done.shape == (batch_size, 1)
+        assert env.state.shape == (batch_size, env.state_size)
+        env.send(np.zeros((batch_size, 1), dtype=int), env_id)
+
+    # test slow env is returned after it is ready
+    env_id, _, _, _ = env.recv()
+    while 0 not in env_id:
+        env.send(np.zeros((batch_size, 1), dtype=int), env_id)
+        env_id, _, _, _ = env.recv()
+
+    state = env.reset()
+    assert state.shape == (num_envs, env.state_size)
+    env.close()